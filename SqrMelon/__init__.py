@@ -15,6 +15,7 @@ from scene import Scene
 from scenelist import SceneList
 from sceneview3d import SceneView
 from shots import ShotManager
+from timelinecache import TimelineCache
 from timeslider import Timer, TimeSlider
 from util import PROJ_EXT, SCENE_EXT, gSettings, ScenesPath, ProjectDir
 import fileutil
@@ -69,6 +70,7 @@ class App(QMainWindowState):
 
         self._timer = Timer()
         self.__shotsManager = ShotManager()
+        self.__timelineCache = None  # uniforms baked by the last recording, see __record
         self.__shotsManager.viewShotAction.connect(self.__onViewShot)
         self.__graphEditor = CurveEditor(self._timer)
         self.__shotsManager.currentChanged.connect(self.__graphEditor.setShot)
@@ -102,7 +104,7 @@ class App(QMainWindowState):
         self.__profiler = Profiler()
 
         self.timeSlider = TimeSlider(self._timer, self.__shotsManager)
-        self.__shotsManager.shotChanged.connect(self.timeSlider.repaint)
+        self.__shotsManager.shotsChanged.connect(self.timeSlider.repaint)
 
         self._addDockWidget(self.__sceneList, where=Qt.TopDockWidgetArea)
         self._addDockWidget(self.__shotsManager, where=Qt.TopDockWidgetArea)
@@ -169,6 +171,16 @@ class App(QMainWindowState):
         lock.setCheckable(True)
         lock.toggled.connect(self.__toggleUILock)
 
+        baked = toolsMenu.addAction('Baked playback')
+        baked.setCheckable(True)
+        baked.setChecked(self.__shotsManager.bakedPlayback())
+        baked.toggled.connect(self.__shotsManager.setBakedPlayback)
+
+        binaryChannels = toolsMenu.addAction('Save channels as binary')
+        binaryChannels.setCheckable(True)
+        binaryChannels.setChecked(self.__shotsManager.binaryChannels())
+        binaryChannels.toggled.connect(self.__shotsManager.setBinaryChannels)
+
         fs = toolsMenu.addAction('Full screen viewport')
         fs.setShortcut(Qt.Key_F11)
         fs.setShortcutContext(Qt.ApplicationShortcut)
@@ -261,6 +273,16 @@ class App(QMainWindowState):
         duration = self._timer.beatsToSeconds(self._timer.end - flooredStart)
         if not fileutil.exists('capture'):
             os.makedirs('capture')
+
+        # bake all uniforms up front, only shots that changed since the previous recording are evaluated again
+        frameTimes = [flooredStart + self._timer.secondsToBeats(frame / float(FPS)) for frame in xrange(int(duration * FPS))]
+        cachePath = 'capture/uniforms_%s.bin' % FPS
+        if self.__timelineCache is None or self.__timelineCache.path() != cachePath or self.__timelineCache.times() != frameTimes:
+            if self.__timelineCache is not None:
+                self.__timelineCache.close()
+            self.__timelineCache = TimelineCache(cachePath, frameTimes)
+        self.__timelineCache.update(self.__shotsManager)
+
         progress = QProgressDialog(self)
         progress.setMaximum(int(duration * FPS))
         prevFrame = 0
@@ -271,17 +293,17 @@ class App(QMainWindowState):
             QApplication.processEvents()
             if progress.wasCanceled():
                 break
-            beats = flooredStart + self._timer.secondsToBeats(frame / float(FPS))
+            beats = frameTimes[frame]
 
-            shot = self.__shotsManager.shotAtTime(beats)
+            shot = self.__timelineCache.shot(frame)
             if shot is None:
                 continue
             sceneFile = os.path.join(ScenesPath(), shot.sceneName + SCENE_EXT)
             scene = Scene.getScene(sceneFile)
             scene.setSize(WIDTH, HEIGHT)
 
-            uniforms = self.__shotsManager.evaluate(beats)
-            textureUniforms = self.__shotsManager.additionalTextures(beats)
+            uniforms = self.__timelineCache.uniforms(frame)
+            textureUniforms = shot.textures
             self.__sceneView._cameraInput.setData(*(uniforms['uOrigin'] + uniforms['uAngles']))  # feed animation into camera so animationprocessor can read it again
             cameraData = self.__sceneView._cameraInput.data()
 
@@ -1,5 +1,5 @@
 from mathutil import Vec2
-from animationgraph.curvedata import Key
+from animationgraph.curvedata import Key, editCurves
 from qtutil import *
 
 
@@ -55,25 +55,27 @@ class DragAction(QUndoCommand):
         """
         Revert key state.
         """
-        i = 0
-        for key in self.__selection:
-            key.setPoint(self.__restoreData[i])
-            i += 1
+        with editCurves(key.parentCurve() for key in self.__selection):
+            i = 0
+            for key in self.__selection:
+                key.setPoint(self.__restoreData[i])
+                i += 1
 
     def _apply(self):
         """
         Set key state.
         """
-        i = 0
-        for key in self.__selection:
-            x = self.__restoreData[i][0] + self.__delta[0]
-            y = self.__restoreData[i][1] + self.__delta[1]
-            if self.__snap[0]:
-                x = round(x * self.__snap[0]) / float(self.__snap[0])
-            if self.__snap[1]:
-                y = round(y * self.__snap[1]) / float(self.__snap[1])
-            key.setPoint(Vec2(x, y))
-            i += 1
+        with editCurves(key.parentCurve() for key in self.__selection):
+            i = 0
+            for key in self.__selection:
+                x = self.__restoreData[i][0] + self.__delta[0]
+                y = self.__restoreData[i][1] + self.__delta[1]
+                if self.__snap[0]:
+                    x = round(x * self.__snap[0]) / float(self.__snap[0])
+                if self.__snap[1]:
+                    y = round(y * self.__snap[1]) / float(self.__snap[1])
+                key.setPoint(Vec2(x, y))
+                i += 1
 
     def update(self, event):
         """
@@ -135,9 +137,7 @@ class InsertKeyAction(QUndoCommand):
             if key:
                 continue
             value = curve.evaluate(time)
-            k = Key(time, value, curve)
-            k._Key__tangentMode = Key.TANGENT_AUTO
-            self.__keys.append(k)
+            self.__keys.append(Key(time, value, curve))
 
     def redo(self):
         for key in self.__keys:
@@ -246,9 +246,47 @@ class EditKeyAction(QUndoCommand):
             key.setValue(value)
 
     def redo(self):
-        for i, key in enumerate(self.__keys):
-            self.__set(key, self.__newValues[i])
+        with editCurves(key.parentCurve() for key in self.__keys):
+            for i, key in enumerate(self.__keys):
+                self.__set(key, self.__newValues[i])
 
     def undo(self):
-        for i, key in enumerate(self.__keys):
-            self.__set(key, self.__oldValues[i])
+        with editCurves(key.parentCurve() for key in self.__keys):
+            for i, key in enumerate(self.__keys):
+                self.__set(key, self.__oldValues[i])
+
+
+class SimplifyAction(QUndoCommand):
+    """
+    Remove keys from the given curves while staying within tolerance of the original curves, see Curve.simplify().
+    The keys are removed on construction, so it only needs to be pushed to the undo stack when removedKeyCount() is not 0.
+    """
+
+    def __init__(self, curves, tolerance):
+        super(SimplifyAction, self).__init__('Simplify')
+        self.__curves = curves
+        self.__removed = []
+        self.__maxError = 0.0
+        for curve in curves:
+            keys, error = curve.simplify(tolerance)
+            self.__removed.append(keys)
+            self.__maxError = max(self.__maxError, error)
+        # pushing the action calls redo(), but the keys are already removed
+        self.__skipRedo = True
+
+    def removedKeyCount(self):
+        return sum(len(keys) for keys in self.__removed)
+
+    def maxError(self):
+        return self.__maxError
+
+    def redo(self):
+        if self.__skipRedo:
+            self.__skipRedo = False
+            return
+        for curve, keys in zip(self.__curves, self.__removed):
+            curve.deleteKeys(keys)
+
+    def undo(self):
+        for curve, keys in zip(self.__curves, self.__removed):
+            curve.reInsertKeys(keys)
@@ -1,3 +1,7 @@
+import math
+from array import array
+from bisect import bisect_left, bisect_right
+from contextlib import contextmanager
 from mathutil import Vec2
 
 
@@ -5,83 +9,131 @@ class Key(object):
     """
     A single key in a curve.
     Currently tangent X values, tangentBorken and the TANGENT_USER mode are unused.
+
+    While a key is inserted in a curve it is only a handle to a row in the curve's arrays,
+    a key that is not in a curve (new or deleted keys) holds its own copy of the data.
     """
     TYPE_MANUAL, TYPE_LINEAR, TYPE_FLAT = range(3)
     TANGENT_AUTO, TANGENT_SPLINE, TANGENT_LINEAR, TANGENT_FLAT, TANGENT_STEPPED, TANGENT_USER = range(6)
 
+    # layout of the detached key data, matches the channel layout in the scene files
+    IN_X, IN_Y, TIME, VALUE, OUT_X, OUT_Y, BROKEN, MODE = range(8)
+
+    # keys are created for every key that is accessed, keep them small
+    __slots__ = ('__parent', '_index', '_row')
+
     def __init__(self, time, value, parent):
-        self.__point = Vec2(time, value)
         self.__parent = parent
         # note that tangent X values have been deprecated and is not exported; they were for cubic bezier curves that never got made
-        self.inTangent = Vec2(0.0, 0.0)
-        self.outTangent = Vec2(0.0, 0.0)
-        self.__inTangentType = Key.TYPE_LINEAR
-        self.__outTangentType = Key.TYPE_LINEAR
-        self.__tangentBroken = False
-        self.__tangentMode = Key.TANGENT_AUTO
+        self._index = None
+        self._row = [0.0, 0.0, time, value, 0.0, 0.0, False, Key.TANGENT_AUTO]
+
+    @classmethod
+    def _view(cls, parent, index):
+        key = cls.__new__(cls)
+        key.__parent = parent
+        key._index = index
+        key._row = None
+        return key
 
     def clone(self, parent):
         k = self.__class__(self.time(), self.value(), parent)
-        k.__inTangent = Vec2(self.inTangent)
-        k.__outTangent = Vec2(self.outTangent)
-        k.__tangentBroken = self.tangentBroken
-        k.__tangentMode = self.tangentMode
+        k._row = self.row()
         return k
 
+    def row(self):
+        """
+        Copy of the key data in the channel layout of the scene files.
+        """
+        if self._index is None:
+            return list(self._row)
+        return self.__parent._rowAt(self._index)
+
+    def __get(self, field):
+        if self._index is None:
+            return self._row[field]
+        return self.__parent._columns[field][self._index]
+
+    def __set(self, field, value):
+        if self._index is None:
+            self._row[field] = value
+        else:
+            # mark the key edited first, this gives the curve a chance to stop sharing its data with clones
+            self.__parent._keyEdited(self._index)
+            self.__parent._columns[field][self._index] = value
+
+    @property
+    def inTangent(self):
+        return Vec2(self.__get(Key.IN_X), self.__get(Key.IN_Y))
+
+    @inTangent.setter
+    def inTangent(self, tangent):
+        self.__set(Key.IN_X, tangent.x)
+        self.__set(Key.IN_Y, tangent.y)
+
+    @property
+    def outTangent(self):
+        return Vec2(self.__get(Key.OUT_X), self.__get(Key.OUT_Y))
+
+    @outTangent.setter
+    def outTangent(self, tangent):
+        self.__set(Key.OUT_X, tangent.x)
+        self.__set(Key.OUT_Y, tangent.y)
+
     # TODO: refactor to use getters/setters instead of properties
     @property
     def tangentBroken(self):
-        return self.__tangentBroken
+        return bool(self.__get(Key.BROKEN))
 
     @tangentBroken.setter
     def tangentBroken(self, tangentBroken):
-        self.__tangentBroken = tangentBroken
+        self.__set(Key.BROKEN, tangentBroken)
         self.updateTangents()
 
     @property
     def tangentMode(self):
-        return self.__tangentMode
+        return self.__get(Key.MODE)
 
     @tangentMode.setter
     def tangentMode(self, tangentMode):
-        self.__tangentMode = tangentMode
+        self.__set(Key.MODE, tangentMode)
         self.updateTangents()
 
     def updateTangents(self):
-        if self.__tangentMode == Key.TANGENT_USER:
-            return
-        if self.__tangentMode == Key.TANGENT_STEPPED:
-            # this leave the input tangent as is, so you can go set e.g. "linear" to get the input, then back to "stepped"
-            # TODO: have "output is stepped" as separate state ("in tangent" with "stepped output" control is tedious)
-            self.outTangent = Vec2(0.0, float('inf'))
+        if self._index is None:
+            mode = self._row[Key.MODE]
+            # keys outside of a curve have no neighbours to compute tangents from
+            if mode == Key.TANGENT_STEPPED:
+                self._row[Key.OUT_X:Key.OUT_Y + 1] = 0.0, float('inf')
+            elif mode == Key.TANGENT_FLAT:
+                self._row[Key.IN_X:Key.IN_Y + 1] = 0.0, 0.0
+                self._row[Key.OUT_X:Key.OUT_Y + 1] = 0.0, 0.0
             return
-        if self.__tangentMode == Key.TANGENT_FLAT:
-            self.inTangent = Vec2(0.0, 0.0)
-            self.outTangent = Vec2(0.0, 0.0)
-        else:
-            self.__parent.updateTangents(self, self.__tangentMode)
+        self.__parent._keyTangentsChanged(self._index)
 
     def time(self):
-        return self.__point.x
+        return self.__get(Key.TIME)
 
     def setTime(self, time):
-        self.__point.x = time
-        self.__parent.sortKeys()
+        self.__set(Key.TIME, time)
+        if self._index is not None:
+            self.__parent._keyMoved(self._index)
 
     def value(self):
-        return self.__point.y
+        return self.__get(Key.VALUE)
 
     def setValue(self, value):
-        self.__point.y = value
+        self.__set(Key.VALUE, value)
         self.__parent.keyChanged(self)
 
     def point(self):
-        return Vec2(self.__point)
+        return Vec2(self.__get(Key.TIME), self.__get(Key.VALUE))
 
     def setPoint(self, point):
-        self.__point = Vec2(point)
-        self.__parent.sortKeys()
-        self.__parent.keyChanged(self)
+        self.__set(Key.TIME, point.x)
+        self.__set(Key.VALUE, point.y)
+        if self._index is not None:
+            self.__parent._keyMoved(self._index)
 
     def delete(self):
         self.__parent.deleteKey(self)
@@ -96,37 +148,203 @@ class Key(object):
 class Curve(object):
     """
     Animation data with Cubic Hermite Spline interpolation.
+
+    Keys are stored as a structure of arrays, one array per field in the Key.IN_X..Key.MODE layout.
+    Key objects are only created when a key is accessed and then kept in sync with the arrays.
+
+    Clones share these arrays, a curve copies them before its first modification (copy on write).
     """
 
     def __init__(self):
-        self.__keys = []
+        self.__setColumns((array('d'), array('d'), array('d'), array('d'), array('d'), array('d'), array('b'), array('b')))
+        self.__owners = [1]  # number of curves sharing the columns, shared between them
+        self.__keys = []  # Key handle per row, or None if it was never accessed
+        self.__editDepth = 0
+        self.__editPending = False
+        self._revision = 0  # incremented on every change, so derived data such as a CurveGroup can tell it is outdated
+        self.__resetSegments()
         self.sortKeys()
 
+    def __setColumns(self, columns):
+        # columns are only modified in place, except by __own(), so these names stay valid until then
+        self._columns = columns
+        self._inTangentX, self._inTangentY, self._times, self._values, self._outTangentX, self._outTangentY, self._tangentBroken, self._tangentModes = columns
+
+    def __own(self):
+        """
+        Make sure the columns and segment cache are not shared with a clone, call before modifying them.
+        Methods that modify the curve call this first, so local references to the columns they take stay valid.
+        """
+        if self.__owners[0] == 1:
+            return
+        self.__owners[0] -= 1
+        self.__owners = [1]
+        self.__setColumns(tuple(column[:] for column in self._columns))
+        self.__segmentLengths = self.__segmentLengths[:]
+        self.__c0 = self.__c0[:]
+        self.__c1 = self.__c1[:]
+        self.__c2 = self.__c2[:]
+        self.__c3 = self.__c3[:]
+        self.__low = self.__low[:]
+        self.__high = self.__high[:]
+
+    def revision(self):
+        """
+        Number that changes whenever the curve is modified.
+        """
+        return self._revision
+
+    def _rowAt(self, index):
+        return [column[index] for column in self._columns]
+
+    def __attach(self, key):
+        """
+        Move the data of a detached key into our arrays and make the key a view on it.
+        The key is inserted after any keys with the same time, where a stable sort would put it,
+        and the tangents around it are updated.
+        """
+        assert key._index is None, 'Key is already inserted in a curve.'
+        idx = bisect_right(self._times, key._row[Key.TIME])
+        self.__insertRow(idx, key._row, key)
+        key._index = idx
+        key._row = None
+        self.__reindex(idx + 1, len(self.__keys))
+        self.__updateNeighbours(idx - 1, idx, idx + 1)
+
+    def __insertRow(self, idx, row, key=None):
+        self.__own()
+        for i, column in enumerate(self._columns):
+            column.insert(idx, row[i])
+        self.__keys.insert(idx, key)
+        self.__insertSegment(idx)
+
+    def __removeRow(self, idx):
+        self.__own()
+        for column in self._columns:
+            del column[idx]
+        self.__keys.pop(idx)
+        self.__removeSegment(idx)
+
+    def __detach(self, index):
+        key = self.__keys[index]
+        if key is not None:
+            key._row = self._rowAt(index)
+            key._index = None
+
     def clone(self):
+        """
+        Copy of the curve that shares the key data and segment cache until either curve is modified.
+        """
         curve = Curve()
-        for key in self.__keys:
-            k = key.clone(curve)
-            curve.__keys.append(k)
+        curve.__setColumns(self._columns)
+        self.__owners[0] += 1
+        curve.__owners = self.__owners
+        curve.__keys = [None] * len(self.__keys)
+        # the segment cache only depends on the columns, so it can be shared (and filled in) by both curves as well
+        curve.__segmentLengths = self.__segmentLengths
+        curve.__c0 = self.__c0
+        curve.__c1 = self.__c1
+        curve.__c2 = self.__c2
+        curve.__c3 = self.__c3
+        curve.__low = self.__low
+        curve.__high = self.__high
+        curve.__bounds = self.__bounds
+        return curve
+
+    @classmethod
+    def fromPacked(cls, data):
+        """
+        Build a curve from a flat sequence of key data, 8 values per key in the Key.IN_X..Key.MODE layout of the scene files.
+
+        The result is the same as calling addKeyWithTangents() for every key in order, but for data that is already
+        sorted by time (as saved) the keys are sorted and their tangents updated only once.
+        """
+        assert len(data) % 8 == 0, 'Packed curve data must have 8 values per key.'
+        curve = cls()
+        times = data[Key.TIME::8]
+        if any(times[i] < times[i - 1] for i in xrange(1, len(times))):
+            for i in xrange(0, len(data), 8):
+                curve.addKeyWithTangents(tangentBroken=int(data[i + Key.BROKEN]), tangentMode=int(data[i + Key.MODE]), *data[i:i + Key.BROKEN])
+            return curve
+
+        for i, column in enumerate(curve._columns):
+            if column.typecode == 'd':
+                column.extend(data[i::8])
+            else:
+                column.extend(int(x) for x in data[i::8])
+        n = len(times)
+        curve.__keys = [None] * n
+        # addKeyWithTangents() solves a new key as an auto tangent last key before applying its mode,
+        # for user and stepped tangents that is what remains of the saved tangents, except for the very first key
+        for i in xrange(1, n):
+            mode = curve._tangentModes[i]
+            if mode == Key.TANGENT_USER:
+                curve._outTangentX[i] = 0.0
+                curve._outTangentY[i] = 0.0
+            if mode in (Key.TANGENT_USER, Key.TANGENT_STEPPED):
+                curve._inTangentX[i] = 0.0
+                curve._inTangentY[i] = 0.0
         curve.sortKeys()
         return curve
 
+    def packed(self):
+        """
+        Key data as a flat array, 8 values per key in the Key.IN_X..Key.MODE layout of the scene files, see fromPacked().
+        """
+        data = array('d', [0.0]) * (len(self._times) * 8)
+        for i, column in enumerate(self._columns):
+            data[i::8] = column if column.typecode == 'd' else array('d', column)
+        return data
+
     def keyAt(self, time):
-        for key in self.__keys:
-            if key.time() == time:
-                return key
+        index = bisect_left(self._times, time)
+        if index < len(self._times) and self._times[index] == time:
+            return self[index]
 
     def deleteKey(self, key):
-        idx = self.__keys.index(key)
-        self.__keys.pop(idx)
-        if idx != 1 and len(self.__keys):
-            self.__keys[idx - 1].updateTangents()
-        if idx != len(self.__keys):
-            self.__keys[idx].updateTangents()
+        idx = key._index
+        assert self.__keys[idx] is key, 'Key is not inserted in this curve.'
+        self.__detach(idx)
+        self.__removeRow(idx)
+        self.__reindex(idx, len(self.__keys))
+        self.__updateNeighbours(idx - 1, idx)
+
+    def deleteKeys(self, keys):
+        """
+        Delete several keys at once, with the same resulting curve as calling deleteKey() for each.
+        """
+        self.__own()
+        indices = set()
+        for key in keys:
+            assert self.__keys[key._index] is key, 'Key is not inserted in this curve.'
+            indices.add(key._index)
+        for idx in indices:
+            self.__detach(idx)
+        keep = [i for i in xrange(len(self.__keys)) if i not in indices]
+        for column in self._columns:
+            column[:] = array(column.typecode, [column[i] for i in keep])
+        self.__keys = [self.__keys[i] for i in keep]
+        self.__reindex(0, len(keep))
+        self.sortKeys()
+
+    def reInsertKeys(self, keys):
+        """
+        Insert several detached keys at once, with the same result as calling reInsert() for each in order.
+        """
+        self.__own()
+        for key in keys:
+            assert key._index is None, 'Key is already inserted in a curve.'
+            for i, column in enumerate(self._columns):
+                column.append(key._row[i])
+            key._index = len(self.__keys)
+            key._row = None
+            self.__keys.append(key)
+        # appended keys end up after existing keys with the same time, like reInsert() would put them
+        self.sortKeys()
 
     def addKeyWithTangents(self, inTangentX, inTangentY, time, value, outTangentX, outTangentY, tangentBroken, tangentMode):
         k = Key(time, value, self)
-        self.__keys.append(k)
-        self.sortKeys()
+        self.__attach(k)
         k.inTangent = Vec2(inTangentX, inTangentY)
         k.outTangent = Vec2(outTangentX, outTangentY)
         k.tangentBroken = tangentBroken
@@ -134,94 +352,358 @@ class Curve(object):
         return k
 
     def reInsert(self, key):
-        self.__keys.append(key)
-        self.sortKeys()
+        self.__attach(key)
 
     def keyChanged(self, key):
-        idx = self.__keys.index(key)
-        first = idx == 0
-        last = idx == len(self.__keys) - 1
+        idx = key._index
+        self.__updateNeighbours(idx - 1, idx, idx + 1)
+
+    def __updateNeighbours(self, *indices):
+        """
+        Update the tangents of the given keys, skipping indices outside the curve.
+        A key's tangents only depend on its direct neighbours, so after inserting, removing or moving a key
+        this gives the same result as updating every key.
+        """
+        if self.__editDepth:
+            self.__editPending = True
+            return
+        for idx in indices:
+            if 0 <= idx < len(self.__keys):
+                self._updateTangentsAt(idx)
+
+    def _keyTangentsChanged(self, idx):
+        self.__updateNeighbours(idx)
+
+    def __reindex(self, start, end):
+        for i in xrange(start, end):
+            if self.__keys[i] is not None:
+                self.__keys[i]._index = i
+
+    def _keyMoved(self, idx):
+        """
+        Move the key at idx to its sorted position after its time changed and update the tangents of the keys
+        it left and the keys it arrived between.
+
+        Keys with the same time keep their relative order, so this matches what sortKeys() would do.
+        """
+        if self.__editDepth:
+            self.__editPending = True
+            return
+        self.__own()
+        times = self._times
+        n = len(times)
+        time = times[idx]
+        # search the other keys for the range of keys with this time, as if idx was removed
+        lo = bisect_left(times, time, 0, idx) + bisect_left(times, time, idx + 1, n) - idx - 1
+        hi = bisect_right(times, time, 0, idx) + bisect_right(times, time, idx + 1, n) - idx - 1
+        dst = min(max(idx, lo), hi)
+        if dst == idx:
+            self.__updateNeighbours(idx - 1, idx, idx + 1)
+            return
 
-        if not first:
-            self.__keys[idx - 1].updateTangents()
-        key.updateTangents()
-        if not last:
-            self.__keys[idx + 1].updateTangents()
+        for column in self._columns:
+            value = column[idx]
+            del column[idx]
+            column.insert(dst, value)
+        self.__keys.insert(dst, self.__keys.pop(idx))
+        self.__reindex(min(idx, dst), max(idx, dst) + 1)
+        # every segment touching a key between the old and new position changed
+        self.__segment = 0
+        for i in xrange(min(idx, dst), min(max(idx, dst) + 2, n)):
+            self.__segmentLengths[i] = 0.0
+
+        if dst > idx:
+            # the old neighbours are now at idx - 1 and idx
+            self.__updateNeighbours(idx - 1, idx, dst - 1, dst, dst + 1)
+        else:
+            # the old neighbours are now at idx and idx + 1
+            self.__updateNeighbours(dst - 1, dst, dst + 1, idx, idx + 1)
+
+    def __resetSegments(self):
+        """
+        Drop the cached segment coefficients, needed when keys are added, removed or reordered.
+
+        Segment i spans key i - 1 to key i and stores the Hermite polynomial coefficients c0..c3, its value range and its length.
+        A length of 0 marks a segment that must be rebuilt, evaluate never picks segments of 0 length.
+        """
+        self.__segment = 0  # segment found by the last evaluate() call, see __findSegment
+        self.__segmentLengths = array('d', [0.0]) * len(self._times)
+        self.__c0 = array('d', self.__segmentLengths)
+        self.__c1 = array('d', self.__segmentLengths)
+        self.__c2 = array('d', self.__segmentLengths)
+        self.__c3 = array('d', self.__segmentLengths)
+        self.__low = array('d', self.__segmentLengths)
+        self.__high = array('d', self.__segmentLengths)
+        self.__table = None  # lookup table for evaluateBaked(), see bakeTable()
+        self.__bounds = None  # cached result of bounds()
+        self._revision += 1
+
+    def __insertSegment(self, idx):
+        self.__segment = 0
+        for segments in (self.__segmentLengths, self.__c0, self.__c1, self.__c2, self.__c3, self.__low, self.__high):
+            segments.insert(idx, 0.0)
+        self._keyEdited(idx)
+
+    def __removeSegment(self, idx):
+        self.__segment = 0
+        for segments in (self.__segmentLengths, self.__c0, self.__c1, self.__c2, self.__c3, self.__low, self.__high):
+            del segments[idx]
+        if idx < len(self.__segmentLengths):
+            self.__segmentLengths[idx] = 0.0
+        self.__table = None
+        self.__bounds = None
+        self._revision += 1
+
+    def _keyEdited(self, idx):
+        """
+        Mark the segments on either side of the key as outdated, call before modifying the key.
+        """
+        self.__own()
+        self.__table = None
+        self.__bounds = None
+        self._revision += 1
+        self.__segmentLengths[idx] = 0.0
+        if idx + 1 < len(self.__segmentLengths):
+            self.__segmentLengths[idx + 1] = 0.0
+
+    def __buildSegment(self, i):
+        times = self._times
+        values = self._values
+        p0y = values[i - 1]
+        p1 = self._outTangentY[i - 1]
+        dx = times[i] - times[i - 1]
+        if p1 == float('inf'):
+            # stepped tangents, hold the value of the first key
+            c0, c1, c2 = 0.0, 0.0, 0.0
+        else:
+            p2 = self._inTangentY[i]
+            dy = values[i] - p0y
+            c0 = (p1 + p2 - dy - dy)
+            c1 = (dy + dy + dy - p1 - p1 - p2)
+            c2 = p1
+        self.__c0[i] = c0
+        self.__c1[i] = c1
+        self.__c2[i] = c2
+        self.__c3[i] = p0y
+        self.__segmentLengths[i] = dx
+        low, high = self.__extent(i, 0.0, 1.0)
+        # include the keys themselves, the polynomial may differ from them by rounding errors or a step
+        self.__low[i] = min(low, p0y, values[i])
+        self.__high[i] = max(high, p0y, values[i])
+        return dx
+
+    def _segment(self, i):
+        """
+        Length and polynomial coefficients c0..c3 of segment i, see __resetSegments().
+        """
+        dx = self.__segmentLengths[i]
+        if not dx:
+            dx = self.__buildSegment(i)
+        return dx, self.__c0[i], self.__c1[i], self.__c2[i], self.__c3[i]
+
+    def __extent(self, i, start, end):
+        """
+        Minimum and maximum value of segment i between the given parameters (0 to 1),
+        checked at either end and where the derivative 3 * c0 * t^2 + 2 * c1 * t + c2 is 0.
+        """
+        c0, c1, c2, c3 = self.__c0[i], self.__c1[i], self.__c2[i], self.__c3[i]
+        candidates = [start, end]
+        if c0:
+            discriminant = c1 * c1 - 3.0 * c0 * c2
+            if discriminant >= 0.0:
+                root = discriminant ** 0.5
+                candidates.append((-c1 + root) / (3.0 * c0))
+                candidates.append((-c1 - root) / (3.0 * c0))
+        elif c1:
+            candidates.append(-c2 / (2.0 * c1))
+        values = [((c0 * t + c1) * t + c2) * t + c3 for t in candidates if start <= t <= end]
+        return min(values), max(values)
+
+    def segmentBounds(self, i):
+        """
+        Minimum and maximum value of the curve between key i - 1 and key i.
+        """
+        if not self.__segmentLengths[i]:
+            self.__buildSegment(i)
+        return self.__low[i], self.__high[i]
+
+    def bounds(self, start=None, end=None):
+        """
+        Exact bounding box of the curve between the given times (clamped to the keys) as minTime, minValue, maxTime, maxValue.
+        Defaults to the whole curve, which is cached. Returns None if there are no keys in the given range.
+        """
+        times = self._times
+        whole = start is None and end is None
+        if whole and self.__bounds is not None:
+            return self.__bounds
+        if not times:
+            return None
+        start = times[0] if start is None else max(start, times[0])
+        end = times[-1] if end is None else min(end, times[-1])
+        if start > end:
+            return None
+
+        low = high = self.evaluate(start)
+        value = self.evaluate(end)
+        low, high = min(low, value), max(high, value)
+        # include the keys in range, even ones that are hidden by another key at the same time
+        for i in xrange(bisect_left(times, start), bisect_right(times, end)):
+            low, high = min(low, self._values[i]), max(high, self._values[i])
+        first = bisect_right(times, start)
+        last = bisect_left(times, end)
+        for i in xrange(max(first, 1), min(last + 1, len(times))):
+            a = max(times[i - 1], start)
+            b = min(times[i], end)
+            if b <= a:
+                continue
+            if a == times[i - 1] and b == times[i]:
+                segmentLow, segmentHigh = self.segmentBounds(i)
+            else:
+                dx = self.__segmentLengths[i]
+                if not dx:
+                    dx = self.__buildSegment(i)
+                segmentLow, segmentHigh = self.__extent(i, (a - times[i - 1]) / dx, (b - times[i - 1]) / dx)
+            low, high = min(low, segmentLow), max(high, segmentHigh)
+
+        result = start, low, end, high
+        if whole:
+            self.__bounds = result
+        return result
+
+    def spansInRegion(self, start, end, low, high):
+        """
+        Time ranges of consecutive segments that are (partially) within the given time and value range,
+        so drawing code can skip segments that are not visible.
+        """
+        times = self._times
+        spans = []
+        for i in xrange(max(bisect_right(times, start), 1), len(times)):
+            if times[i - 1] >= end:
+                break
+            if times[i - 1] == times[i]:
+                continue
+            segmentLow, segmentHigh = self.segmentBounds(i)
+            if segmentHigh < low or segmentLow > high:
+                continue
+            a = max(times[i - 1], start)
+            b = min(times[i], end)
+            if spans and spans[-1][1] == a:
+                spans[-1][1] = b
+            else:
+                spans.append([a, b])
+        return spans
+
+    def _updateTangentsAt(self, idx):
+        self._keyEdited(idx)
+        mode = self._tangentModes[idx]
+        if mode == Key.TANGENT_USER:
+            return
+        if mode == Key.TANGENT_STEPPED:
+            # this leave the input tangent as is, so you can go set e.g. "linear" to get the input, then back to "stepped"
+            # TODO: have "output is stepped" as separate state ("in tangent" with "stepped output" control is tedious)
+            self._outTangentX[idx] = 0.0
+            self._outTangentY[idx] = float('inf')
+            return
+        if mode == Key.TANGENT_FLAT:
+            self._inTangentX[idx] = 0.0
+            self._inTangentY[idx] = 0.0
+            self._outTangentX[idx] = 0.0
+            self._outTangentY[idx] = 0.0
+        else:
+            self.__solveTangents(idx, mode)
 
     def updateTangents(self, key, mode):
-        idx = self.__keys.index(key)
+        self._keyEdited(key._index)
+        self.__solveTangents(key._index, mode)
+
+    def __solveTangents(self, idx, mode):
+        times = self._times
+        values = self._values
         first = idx == 0
-        last = idx == len(self.__keys) - 1
+        last = idx == len(times) - 1
 
         if first and last:
             return
 
         def keyDirection(a, b):
-            keyDifference = b.point() - a.point()
+            x = times[b] - times[a]
+            y = values[b] - values[a]
+            length = (x * x + y * y) ** 0.5
             try:
-                keyDifference.normalize()
-            except:
-                return Vec2(0.0, 0.0)
-            keyDifference.x = abs(keyDifference.x)
-            return keyDifference
-
-        def finalize():
-            if not first and key.inTangent.length() != 0:
-                pd = self.__keys[idx].time() - self.__keys[idx - 1].time()
+                x /= length
+                y /= length
+            except ZeroDivisionError:
+                return 0.0, 0.0
+            return abs(x), y
+
+        def finalize(inX, inY, outX, outY):
+            if not first and (inX * inX + inY * inY) ** 0.5 != 0:
+                pd = times[idx] - times[idx - 1]
                 try:
-                    key.inTangent *= pd / key.inTangent.x
-                except:
+                    scale = pd / inX
+                    inX *= scale
+                    inY *= scale
+                except ZeroDivisionError:
                     pass
-            if not last and key.outTangent.length() != 0:
-                nd = self.__keys[idx + 1].time() - self.__keys[idx].time()
+            if not last and (outX * outX + outY * outY) ** 0.5 != 0:
+                nd = times[idx + 1] - times[idx]
                 try:
-                    key.outTangent *= nd / key.outTangent.x
-                except:
+                    scale = nd / outX
+                    outX *= scale
+                    outY *= scale
+                except ZeroDivisionError:
                     pass
+            self._inTangentX[idx] = inX
+            self._inTangentY[idx] = inY
+            self._outTangentX[idx] = outX
+            self._outTangentY[idx] = outY
 
         if mode == Key.TANGENT_LINEAR:
             if first:
-                key.inTangent = Vec2(0.0, 0.0)
+                inX, inY = 0.0, 0.0
             else:
-                key.inTangent = keyDirection(self.__keys[idx], self.__keys[idx - 1])
-                key.inTangent.x = -key.inTangent.x
+                inX, inY = keyDirection(idx, idx - 1)
+                inX = -inX
 
             if last:
-                key.outTangent = Vec2(0.0, 0.0)
+                outX, outY = 0.0, 0.0
             else:
-                key.outTangent = keyDirection(self.__keys[idx], self.__keys[idx + 1])
+                outX, outY = keyDirection(idx, idx + 1)
 
-            finalize()
+            finalize(inX, inY, outX, outY)
             return
 
         elif mode == Key.TANGENT_SPLINE:
             if first:
-                key.outTangent = keyDirection(self.__keys[idx], self.__keys[idx + 1])
-                key.inTangent = key.outTangent
+                outX, outY = keyDirection(idx, idx + 1)
+                finalize(outX, outY, outX, outY)
+                # the in tangent shares the out tangent, so it is scaled along with it
+                self._inTangentX[idx] = self._outTangentX[idx]
+                self._inTangentY[idx] = self._outTangentY[idx]
+                return
             elif last:
-                key.inTangent = keyDirection(self.__keys[idx], self.__keys[idx - 1])
-                key.inTangent.x = -key.inTangent.x
-                key.outTangent = -key.inTangent
+                inX, inY = keyDirection(idx, idx - 1)
+                inX = -inX
+                outX, outY = -inX, -inY
             else:
-                key.outTangent = keyDirection(self.__keys[idx - 1], self.__keys[idx + 1])
-                key.inTangent = -key.outTangent
+                outX, outY = keyDirection(idx - 1, idx + 1)
+                inX, inY = -outX, -outY
 
-            finalize()
+            finalize(inX, inY, outX, outY)
             return
 
         elif mode == Key.TANGENT_AUTO:
             def sgn(x):
                 return -1 if x < 1 else 1 if x > 1 else 0
 
-            if first or last or sgn(self.__keys[idx - 1].value() - key.value()) == sgn(
-                    self.__keys[idx + 1].value() - key.value()):
-                key.inTangent = Vec2(0.0, 0.0)
-                key.outTangent = Vec2(0.0, 0.0)
+            if first or last or sgn(values[idx - 1] - values[idx]) == sgn(values[idx + 1] - values[idx]):
+                inX, inY = 0.0, 0.0
+                outX, outY = 0.0, 0.0
             else:
-                key.outTangent = keyDirection(self.__keys[idx - 1], self.__keys[idx + 1])
-                key.inTangent = -key.outTangent
+                outX, outY = keyDirection(idx - 1, idx + 1)
+                inX, inY = -outX, -outY
 
-            finalize()
+            finalize(inX, inY, outX, outY)
             return
 
         elif mode in (Key.TANGENT_USER, Key.TANGENT_STEPPED):
@@ -229,21 +711,82 @@ class Curve(object):
 
         assert False, 'Invalid tangent mode for key.'
 
+    def beginEdit(self):
+        """
+        Start an edit transaction, prefer the edit() context manager.
+
+        Until the matching endEdit() call keys are not re-sorted and tangents are not updated when keys change,
+        so the curve should not be evaluated in the meantime. Transactions can be nested.
+        """
+        self.__editDepth += 1
+
+    def endEdit(self):
+        """
+        End an edit transaction, the outermost one sorts the keys and updates all tangents once if anything changed.
+        """
+        assert self.__editDepth > 0, 'endEdit() without beginEdit().'
+        self.__editDepth -= 1
+        if not self.__editDepth:
+            self.__applyEdits()
+
+    @contextmanager
+    def edit(self):
+        """
+        Edit transaction, use when changing many keys at once:
+
+        with curve.edit():
+            for key in keys:
+                key.setPoint(...)
+        """
+        self.beginEdit()
+        try:
+            yield self
+        finally:
+            self.endEdit()
+
+    def __applyEdits(self):
+        if self.__editPending:
+            self.__editPending = False
+            self.sortKeys()
+
     def sortKeys(self):
-        # TODO: optimize in any way?
-        self.__keys.sort(key=lambda k: k.time())
-        for key in self.__keys:
-            key.updateTangents()
+        """
+        Fully re-sort the keys and update all tangents.
+        Single key edits are handled by _keyMoved() instead, edit transactions end with this.
+        """
+        self.__own()
+        times = self._times
+        self.__resetSegments()
+        order = sorted(xrange(len(times)), key=times.__getitem__)
+        if order != range(len(times)):
+            for column in self._columns:
+                column[:] = array(column.typecode, [column[i] for i in order])
+            self.__keys = [self.__keys[i] for i in order]
+            for i, key in enumerate(self.__keys):
+                if key is not None:
+                    key._index = i
+        for i in xrange(len(times)):
+            self._updateTangentsAt(i)
 
     def __iter__(self):
-        for key in self.__keys:
-            yield key
+        for i in xrange(len(self.__keys)):
+            yield self[i]
 
     def __getitem__(self, index):
-        return self.__keys[index]
+        if index < 0:
+            index += len(self.__keys)
+        key = self.__keys[index]
+        if key is None:
+            key = Key._view(self, index)
+            self.__keys[index] = key
+        return key
 
-    def __setitem__(self, index, pos):
-        self.__keys[index] = pos
+    def __setitem__(self, index, key):
+        self.__own()
+        row = key.row()
+        for i, column in enumerate(self._columns):
+            column[index] = row[i]
+        self.sortKeys()
 
     def __len__(self):
         return len(self.__keys)
@@ -252,65 +795,409 @@ class Curve(object):
         """
         Speed up the animation by the given multiplier.
         """
-        # reverse to avoid auto-sorting messing up anything
-        for key in reversed(self.__keys):
-            key.setTime(key.time() / speed)
+        with self.edit():
+            self.__own()
+            times = self._times
+            for i in xrange(len(times)):
+                times[i] /= speed
+            self.__editPending = True
 
     def move(self, deltaTime):
         """
         Move the animation by the given addition.
         """
-        if deltaTime > 0.0:  # shifting to the right, reverse application order to avoid auto-sorting messing up anything
-            for key in reversed(self.__keys):
-                key.setTime(key.time() + deltaTime)
-        else:
-            for key in self.__keys:
-                key.setTime(key.time() + deltaTime)
+        with self.edit():
+            self.__own()
+            times = self._times
+            for i in xrange(len(times)):
+                times[i] += deltaTime
+            self.__editPending = True
 
     def trim(self, start, end):
         """
         Delete keys outside of the given time range.
         """
         assert start <= end
+        # this needs the keys in order
+        self.__applyEdits()
+        self.__own()
         startIdx = -1
         endIdx = len(self.__keys)
-        for i, key in enumerate(self.__keys):
-            if startIdx < 0 and key.time() > start:
+        for i, time in enumerate(self._times):
+            if startIdx < 0 and time > start:
                 startIdx = i - 1
-            if key.time() >= end:
+            if time >= end:
                 endIdx = i + 1
                 break
-        self.__keys = self.__keys[max(startIdx, 0):min(endIdx, len(self.__keys))]
+        startIdx = max(startIdx, 0)
+        endIdx = min(endIdx, len(self.__keys))
+        for i in range(startIdx) + range(endIdx, len(self.__keys)):
+            self.__detach(i)
+        for column in self._columns:
+            column[:] = column[startIdx:endIdx]
+        self.__keys = self.__keys[startIdx:endIdx]
+        self.__resetSegments()
+        self.__reindex(0, len(self.__keys))
+        # the new first and last keys lost a neighbour, the keys are in order so this needs no deferring
+        if self.__keys:
+            self._updateTangentsAt(0)
+            self._updateTangentsAt(len(self.__keys) - 1)
+
+    def simplify(self, tolerance):
+        """
+        Remove keys for as long as the curve stays within tolerance of the original curve.
+        The first and last key are kept, so the curve keeps its range.
+        :returns: The removed keys, which can be put back with reInsertKeys() to undo, and the maximum error.
+        """
+        # try removing keys one by one on a copy without Key objects to keep up to date
+        work = self.clone()
+        work.__own()
+        times = work._times
+        origin = range(len(times))
+        i = 1
+        while i < len(times) - 1:
+            if times[i - 1] == times[i] or times[i] == times[i + 1]:
+                # keys at the same time form a discontinuity
+                i += 1
+                continue
+            # removing a key updates the tangents of its neighbours, which affects the segments up to their neighbours
+            start = times[max(i - 2, 0)]
+            end = times[min(i + 2, len(times) - 1)]
+            row = work._rowAt(i)
+            work.__removeRow(i)
+            work.__updateNeighbours(i - 1, i)
+            if work.__maxError(self, start, end) <= tolerance:
+                origin.pop(i)
+            else:
+                work.__insertRow(i, row)
+                work.__updateNeighbours(i - 1, i, i + 1)
+                i += 1
+
+        kept = set(origin)
+        removed = [self[j] for j in xrange(len(self._times)) if j not in kept]
+        if not removed:
+            return removed, 0.0
+        error = work.__maxError(self, times[0], times[-1])
+        self.deleteKeys(removed)
+        return removed, error
+
+    def __polynomial(self, i, start, end):
+        """
+        Coefficients of segment i in the range start to end, as a cubic polynomial over 0 to 1.
+        """
+        dx = self.__segmentLengths[i]
+        if not dx:
+            dx = self.__buildSegment(i)
+        c0, c1, c2, c3 = self.__c0[i], self.__c1[i], self.__c2[i], self.__c3[i]
+        # substitute t = a + b * s
+        a = (start - self._times[i - 1]) / dx
+        b = (end - start) / dx
+        return (c0 * b * b * b,
+                (3.0 * c0 * a + c1) * b * b,
+                ((3.0 * c0 * a + 2.0 * c1) * a + c2) * b,
+                ((c0 * a + c1) * a + c2) * a + c3)
+
+    def __maxError(self, other, start, end):
+        """
+        Maximum absolute difference with another curve between the given times.
+        Between the keys of both curves the difference is a cubic, so its maximum is at either end or where its derivative is 0.
+        """
+        breaks = set(self._times[bisect_right(self._times, start):bisect_left(self._times, end)])
+        breaks.update(other._times[bisect_right(other._times, start):bisect_left(other._times, end)])
+        breaks = [start] + sorted(breaks) + [end]
+        error = 0.0
+        for j in xrange(len(breaks) - 1):
+            a = breaks[j]
+            b = breaks[j + 1]
+            if a == b:
+                continue
+            mid = (a + b) * 0.5
+            i = bisect_right(self._times, mid)
+            k = bisect_right(other._times, mid)
+            if i in (0, len(self._times)) or k in (0, len(other._times)):
+                # outside the range of keys a curve is constant
+                error = max(error, abs(self.evaluate(mid) - other.evaluate(mid)))
+                continue
+            p = self.__polynomial(i, a, b)
+            q = other.__polynomial(k, a, b)
+            d3, d2, d1, d0 = p[0] - q[0], p[1] - q[1], p[2] - q[2], p[3] - q[3]
+            candidates = [0.0, 1.0]
+            # roots of 3 * d3 * s^2 + 2 * d2 * s + d1
+            if d3:
+                discriminant = d2 * d2 - 3.0 * d3 * d1
+                if discriminant >= 0.0:
+                    root = discriminant ** 0.5
+                    candidates.append((-d2 + root) / (3.0 * d3))
+                    candidates.append((-d2 - root) / (3.0 * d3))
+            elif d2:
+                candidates.append(-d1 / (2.0 * d2))
+            for s in candidates:
+                if 0.0 <= s <= 1.0:
+                    error = max(error, abs(((d3 * s + d2) * s + d1) * s + d0))
+        return error
+
+    def __findSegment(self, time):
+        """
+        Index of the first key after the given time, or len(self) if there is none.
+        Tries the segment of the previous call and the one after it before bisecting,
+        so playback moving forward through the curve resolves in constant time.
+        """
+        keyTimes = self._times
+        numKeys = len(keyTimes)
+        i = self.__segment
+        if 0 < i <= numKeys and keyTimes[i - 1] <= time:
+            if i == numKeys or time < keyTimes[i]:
+                return i
+            if i + 1 == numKeys or time < keyTimes[i + 1]:
+                self.__segment = i + 1
+                return i + 1
+        i = bisect_right(keyTimes, time)
+        self.__segment = i
+        return i
 
     def evaluate(self, time):
         """
         Hermite spline interpolation at the given time.
         Times outside the bounds are just clamped to the endpoints.
         """
-        if not self.__keys:
+        times = self._times
+        if not times:
             return 0.0
 
-        if time <= self.__keys[0].time():
-            return self.__keys[0].value()
-
-        for i in range(1, len(self.__keys)):
-            if self.__keys[i].time() > time:
-                p0 = self.__keys[i - 1].point()
-                p1 = self.__keys[i - 1].outTangent.y
-                # stepped tangents
-                if p1 == float('inf'):
-                    return p0.y
-                p2 = self.__keys[i].inTangent.y
-                p3 = self.__keys[i].point()
-
-                dx = p3.x - p0.x
-                dy = p3.y - p0.y
-                c0 = (p1 + p2 - dy - dy)
-                c1 = (dy + dy + dy - p1 - p1 - p2)
-                c2 = p1
-                c3 = p0.y
-
-                t = (time - p0.x) / dx
-                return t * (t * (t * c0 + c1) + c2) + c3
-
-        return self.__keys[-1].value()
+        if time <= times[0]:
+            return self._values[0]
+
+        i = self.__findSegment(time)
+        if i == len(times):
+            return self._values[-1]
+
+        dx = self.__segmentLengths[i]
+        if not dx:
+            dx = self.__buildSegment(i)
+        t = (time - times[i - 1]) / dx
+        return t * (t * (t * self.__c0[i] + self.__c1[i]) + self.__c2[i]) + self.__c3[i]
+
+    def hasTable(self):
+        """
+        Whether the lookup table is up to date, it is dropped by any edit.
+        """
+        return self.__table is not None
+
+    def bakeTable(self, rate, tolerance):
+        """
+        Resample the curve into a lookup table of rate samples per time unit for evaluateBaked().
+
+        Between two samples within one segment linear interpolation is off by at most h^2 / 8 * max|f''|,
+        with h the sample distance. f is cubic so f'' is linear and its maximum is found at either sample.
+        Cells where this bound exceeds the tolerance, or that are not within a single smooth segment
+        (keys, stepped tangents) are marked to use evaluate() instead, so the table is never off by more than tolerance.
+        """
+        times = self._times
+        n = len(times)
+        if n < 2:
+            # evaluate() is a constant anyway
+            self.__table = 0.0, rate, array('d'), array('b')
+            return
+
+        start = times[0]
+        cells = int(math.ceil((times[-1] - start) * rate))
+        sampleTimes = [start + i / float(rate) for i in xrange(cells + 1)]
+        samples = self.evaluateMany(sampleTimes)
+        exact = array('b', [1]) * cells
+        stepped = float('inf')
+        segment = 1
+        for i in xrange(cells):
+            a = sampleTimes[i]
+            b = sampleTimes[i + 1]
+            while segment < n - 1 and times[segment] <= a:
+                segment += 1
+            if b > times[segment] or self._outTangentY[segment - 1] == stepped:
+                continue
+            if (b == times[segment] and segment + 1 < n and times[segment + 1] == b) or (a == start and segment > 1):
+                # evaluate() jumps to the last of several keys at the same time, except at the very start
+                continue
+            dx = self.__segmentLengths[segment]
+            if not dx:
+                dx = self.__buildSegment(segment)
+            c0 = self.__c0[segment] * 6.0
+            c1 = self.__c1[segment] * 2.0
+            ta = (a - times[segment - 1]) / dx
+            tb = (b - times[segment - 1]) / dx
+            curvature = max(abs(c0 * ta + c1), abs(c0 * tb + c1)) / (dx * dx)
+            if (b - a) * (b - a) * 0.125 * curvature <= tolerance:
+                exact[i] = 0
+        self.__table = start, rate, samples, exact
+
+    def evaluateBaked(self, time):
+        """
+        Evaluate using the lookup table built by bakeTable(), within its tolerance of evaluate().
+        Falls back to evaluate() when the table is outdated.
+        """
+        table = self.__table
+        if table is None:
+            return self.evaluate(time)
+        start, rate, samples, exact = table
+        u = (time - start) * rate
+        if not 0.0 < u < len(exact):
+            return self.evaluate(time)
+        i = int(u)
+        if exact[i]:
+            return self.evaluate(time)
+        a = samples[i]
+        return a + (samples[i + 1] - a) * (u - i)
+
+    def evaluateMany(self, times):
+        """
+        Hermite spline interpolation at each of the given times, returns an array of values.
+        Results are identical to calling evaluate() per time. The segment search continues from
+        the previous sample, so ascending times (as used to draw or bake a curve) walk the keys only once.
+        """
+        result = array('d', times)
+        keyTimes = self._times
+        values = self._values
+        numKeys = len(keyTimes)
+        if not numKeys:
+            for j in xrange(len(result)):
+                result[j] = 0.0
+            return result
+
+        first = keyTimes[0]
+        i = 1
+        segment = None
+        for j, time in enumerate(result):
+            if time <= first:
+                result[j] = values[0]
+                continue
+
+            # find the first key after time, from the last segment if we moved forward
+            if i > 1 and keyTimes[i - 1] > time:
+                i = bisect_right(keyTimes, time)
+            while i < numKeys and keyTimes[i] <= time:
+                i += 1
+            if i == numKeys:
+                result[j] = values[-1]
+                continue
+
+            if segment != i:
+                segment = i
+                p0x = keyTimes[i - 1]
+                dx = self.__segmentLengths[i]
+                if not dx:
+                    dx = self.__buildSegment(i)
+                c0 = self.__c0[i]
+                c1 = self.__c1[i]
+                c2 = self.__c2[i]
+                c3 = self.__c3[i]
+
+            t = (time - p0x) / dx
+            result[j] = t * (t * (t * c0 + c1) + c2) + c3
+
+        return result
+
+
+class CurveGroup(object):
+    """
+    Animation of a vec2, vec3 or vec4 uniform, evaluated with one segment search for all components.
+
+    The components are regular curves, one per channel, so they are still edited and saved one by one.
+    While all components have keys at the same times the group compiles them into one shared time axis
+    with the polynomial coefficients of all components per segment. The group recompiles when any of the
+    curves changed, and evaluates the curves one by one while their key times differ.
+    """
+
+    def __init__(self, curves):
+        assert 2 <= len(curves) <= 4, 'Curve groups have 2 to 4 components.'
+        self.__curves = tuple(curves)
+        self.__revisions = None
+        self.__segment = 0  # segment found by the last evaluate() call, see __findSegment
+
+    def curves(self):
+        return self.__curves
+
+    def __len__(self):
+        return len(self.__curves)
+
+    def isAligned(self):
+        """
+        Whether all components have keys at the same times, only then evaluate() uses the shared time axis.
+        """
+        self.__update()
+        return self.__times is not None
+
+    def __update(self):
+        revisions = [curve._revision for curve in self.__curves]
+        if revisions == self.__revisions:
+            return
+        self.__revisions = revisions
+        self.__segment = 0
+
+        curves = self.__curves
+        times = curves[0]._times
+        if any(curve._times != times for curve in curves):
+            self.__times = None
+            return
+
+        # per segment its length and the coefficients c0..c3 of each component
+        numKeys = len(times)
+        self.__times = array('d', times)
+        self.__segments = [None]
+        for i in xrange(1, numKeys):
+            segments = [curve._segment(i) for curve in curves]
+            self.__segments.append((segments[0][0], tuple(segment[1:] for segment in segments)))
+        if numKeys:
+            self.__first = [curve._values[0] for curve in curves]
+            self.__last = [curve._values[-1] for curve in curves]
+
+    def __findSegment(self, time):
+        """
+        Index of the first key after the given time, see Curve.__findSegment().
+        """
+        keyTimes = self.__times
+        numKeys = len(keyTimes)
+        i = self.__segment
+        if 0 < i <= numKeys and keyTimes[i - 1] <= time:
+            if i == numKeys or time < keyTimes[i]:
+                return i
+            if i + 1 == numKeys or time < keyTimes[i + 1]:
+                self.__segment = i + 1
+                return i + 1
+        i = bisect_right(keyTimes, time)
+        self.__segment = i
+        return i
+
+    def evaluate(self, time):
+        """
+        Value of every component at the given time as a list, identical to calling Curve.evaluate() per component.
+        """
+        self.__update()
+        times = self.__times
+        if times is None:
+            return [curve.evaluate(time) for curve in self.__curves]
+        if not times:
+            return [0.0] * len(self.__curves)
+
+        if time <= times[0]:
+            return list(self.__first)
+
+        i = self.__findSegment(time)
+        if i == len(times):
+            return list(self.__last)
+
+        dx, coefficients = self.__segments[i]
+        t = (time - times[i - 1]) / dx
+        return [t * (t * (t * c0 + c1) + c2) + c3 for c0, c1, c2, c3 in coefficients]
+
+
+@contextmanager
+def editCurves(curves):
+    """
+    Edit transaction on several curves at once, see Curve.edit().
+    """
+    curves = set(curves)
+    for curve in curves:
+        curve.beginEdit()
+    try:
+        yield
+    finally:
+        for curve in curves:
+            curve.endEdit()
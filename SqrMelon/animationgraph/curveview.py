@@ -13,7 +13,7 @@ from mathutil import Vec2
 
 from animationgraph.curvedata import Curve
 from animationgraph.curveselection import Selection, MarqueeSelectAction
-from animationgraph.curveactions import InsertKeyAction, SetKeyAction, DeleteAction, DragAction, EditKeyAction
+from animationgraph.curveactions import InsertKeyAction, SetKeyAction, DeleteAction, DragAction, EditKeyAction, SimplifyAction
 from animationgraph.viewactions import CameraFrameAction, CameraPanAction, CameraZoomAction, CameraUndoCommand
 
 
@@ -112,21 +112,22 @@ class CurveView(QWidget):
         else:
             self.repaint()
 
-    # Frame our view on a set of keys
-    def __frameOnKeys(self, keys):
+    # Frame our view on the union of a set of curve bounds, as returned by Curve.bounds()
+    def __frameOnBounds(self, boundsPerCurve):
         boundsMin = None
         boundsMax = None
 
-        for key in keys:
-            point = key.point()
+        for bounds in boundsPerCurve:
+            if bounds is None:
+                continue
             if boundsMin is None:
-                boundsMin = Vec2(point)
-                boundsMax = Vec2(boundsMin)
+                boundsMin = Vec2(bounds[0], bounds[1])
+                boundsMax = Vec2(bounds[2], bounds[3])
                 continue
-            boundsMin.x = min(boundsMin.x, point.x)
-            boundsMin.y = min(boundsMin.y, point.y)
-            boundsMax.x = max(boundsMax.x, point.x)
-            boundsMax.y = max(boundsMax.y, point.y)
+            boundsMin.x = min(boundsMin.x, bounds[0])
+            boundsMin.y = min(boundsMin.y, bounds[1])
+            boundsMax.x = max(boundsMax.x, bounds[2])
+            boundsMax.y = max(boundsMax.y, bounds[3])
         if boundsMin is None:
             return
 
@@ -138,20 +139,22 @@ class CurveView(QWidget):
         self.__cameraUndoStack.push(CameraFrameAction(self.__camera, region))
         self.repaint()
 
-    # Frame our view on the selected keys (if any, otherwise on all)
+    # Frame our view on the curves between the selected keys (if any, otherwise on all)
     def frameSelected(self):
         keys = self.__selection.keys()
-        if keys:
-            self.__frameOnKeys(keys)
-        else:
+        if not keys:
             self.frameAll()
+            return
+        timeRanges = {}
+        for key in keys:
+            curve = key.parentCurve()
+            start, end = timeRanges.get(curve, (key.time(), key.time()))
+            timeRanges[curve] = min(start, key.time()), max(end, key.time())
+        self.__frameOnBounds(curve.bounds(start, end) for curve, (start, end) in timeRanges.iteritems())
 
-    # Frame our view on all keys
+    # Frame our view on all visible curves
     def frameAll(self):
-        keys = []
-        for row, i, key in self.iterVisibleKeys():
-            keys.append(key)
-        self.__frameOnKeys(keys)
+        self.__frameOnBounds(self.__models[0].item(row).data().bounds() for row in self.visibleRows())
 
     def keyPressEvent(self, event):
         if event.key() == Qt.Key_F:
@@ -244,6 +247,22 @@ class CurveView(QWidget):
         self.selectionChanged.emit()
         self.repaint()
 
+    def simplifyCurves(self, tolerance):
+        """
+        Remove keys from the visible curves while keeping them within tolerance.
+        :returns: The SimplifyAction, to report the result. It is only pushed to the undo stack when it removed keys.
+        """
+        curves = [self.__models[0].item(row).data() for row in self.visibleRows()]
+        if not curves:
+            return None
+        self.__selection.clear()
+        action = SimplifyAction(curves, tolerance)
+        if action.removedKeyCount():
+            self.__undoStack.push(action)
+        self.selectionChanged.emit()
+        self.repaint()
+        return action
+
     def pixelToScene(self, point, overrideRegion=None):
         if not overrideRegion:
             x, y, w, h = self.__camera.region()
@@ -489,7 +508,7 @@ class CurveView(QWidget):
 
     __COLORS = {'x': Qt.red, 'y': Qt.green, 'z': Qt.blue, 'w': Qt.white}
 
-    def _drawCurves(self, painter, rows, start, end, precision):
+    def _drawCurves(self, painter, rows, start, end, low, high, precision):
         # draw lines
         for row in rows:
             item = self.__models[0].item(row)
@@ -501,15 +520,16 @@ class CurveView(QWidget):
                 painter.setPen(self.__COLORS[identifier])
             else:
                 painter.setPen(Qt.red)
-            px, py = None, None
-            x = max(start, curve[0].time())
-            while x < min(end, curve[-1].time()):
-                y = curve.evaluate(x)
-                if py is not None:
-                    painter.drawLine(QPointF(px, py), QPointF(x, y))
-                px = x
-                py = y
-                x += precision
+            # only evaluate segments that pass through the visible region
+            for spanStart, spanEnd in curve.spansInRegion(start, end, low, high):
+                xs = []
+                x = spanStart
+                while x < spanEnd:
+                    xs.append(x)
+                    x += precision
+                xs.append(spanEnd)
+                ys = curve.evaluateMany(xs)
+                painter.drawPolyline(QPolygonF([QPointF(px, py) for px, py in zip(xs, ys)]))
 
     def _drawKeys(self, painter, scalex, scaley, rows):
         # draw points
@@ -570,13 +590,17 @@ class CurveView(QWidget):
         painter.translate(-rect[0], -rect[1])
 
         rows = self.visibleRows()
-        start = self.pixelToScene(QPoint(event.rect().x(), event.rect().y())).x()
-        end = self.pixelToScene(QPoint(event.rect().right(), event.rect().bottom())).x()
+        topLeft = self.pixelToScene(QPoint(event.rect().x(), event.rect().y()))
+        bottomRight = self.pixelToScene(QPoint(event.rect().right(), event.rect().bottom()))
+        start = topLeft.x()
+        end = bottomRight.x()
+        low = min(topLeft.y(), bottomRight.y())
+        high = max(topLeft.y(), bottomRight.y())
         PRECISION = 4
         x, y, w, h = self.__camera.region()
         precision = (PRECISION / float(self.width())) * w
 
-        self._drawCurves(painter, rows, start, end, precision)
+        self._drawCurves(painter, rows, start, end, low, high, precision)
         self._drawKeys(painter, scalex, scaley, rows)
 
         # draw marquee selection area
@@ -781,6 +805,8 @@ class CurveEditor(QWidget):
         self.__pasteAction.triggered.connect(self.__pasteChannels)
         self.__pasteOverAction = self.__channelMenu.addAction('Paste into selected channel')
         self.__pasteOverAction.triggered.connect(self.__pasteSelectedChannel)
+        self.__simplifyAction = self.__channelMenu.addAction('Simplify selected channel(s)')
+        self.__simplifyAction.triggered.connect(self.__simplifySelectedChannels)
         self.__clipboard = []
 
     def __copySelectedChannels(self):
@@ -796,6 +822,7 @@ class CurveEditor(QWidget):
             return
         for name, curve in self.__clipboard:
             self.__shot.curves[name] = curve.clone()
+        self.__shot.updateChannelLayout()
         self.__view.undoStacks()[0].clear()
         self.setShot(self.__shot)
 
@@ -806,11 +833,23 @@ class CurveEditor(QWidget):
         assert len(self.__clipboard) == 1, 'Something went wrong when pasting from one channel to another, as it found multiple sources'
         assert len(indexes) == 1, 'Something went wrong when pasting from one channel to another, as it found multiple targets'
         self.__shot.curves[self.__model.itemFromIndex(indexes).text()] = self.__clipboard[0].clone()
+        self.__shot.updateChannelLayout()
         self.__view.undoStacks()[0].clear()
         self.setShot(self.__shot)
 
+    def __simplifySelectedChannels(self):
+        tolerance, ok = QInputDialog.getDouble(self, 'Simplify channels', 'Maximum error', float(gSettings.value('SimplifyTolerance', 0.001)), 0.0, 1000.0, 6)
+        if not ok:
+            return
+        gSettings.setValue('SimplifyTolerance', tolerance)
+        action = self.__view.simplifyCurves(tolerance)
+        if action is None:
+            return
+        QMessageBox.information(self, 'Simplify channels', 'Removed %s keys, maximum error %s.' % (action.removedKeyCount(), action.maxError()))
+
     def __channelContextMenu(self, pos):
         self.__copyAction.setEnabled(bool(len(self.__channels.selectedIndexes())))
+        self.__simplifyAction.setEnabled(bool(len(self.__channels.selectedIndexes())))
         self.__pasteAction.setEnabled(bool(self.__clipboard))
         self.__pasteOverAction.setEnabled(len(self.__clipboard) == 1 and len(self.__channels.selectedIndexes()) == 1)
         self.__channelMenu.popup(self.__channels.mapToGlobal(pos))
@@ -935,6 +974,7 @@ class CurveEditor(QWidget):
             name = self.__model.item(row).text()
             self.__model.removeRow(row)
             del self.__shot.curves[name]
+        self.__shot.updateChannelLayout()
 
     def _onAddChannel(self):
         res = QInputDialog.getText(self, 'Create channel', 'Name with optional [xy], [xyz], [xyzw] suffix\ne.g. "uPosition[xyz]", "uSize[xy]".')
@@ -964,3 +1004,4 @@ class CurveEditor(QWidget):
             item = QStandardItem(channelName)
             item.setData(curve)
             self.__model.appendRow(item)
+        self.__shot.updateChannelLayout()
@@ -7,6 +7,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from build.codeoptimize import optimizeText
 import fileutil
 from util import ParseXMLWithIncludes, ScenesPath, SCENE_EXT
+from sceneparse import readChannels
 
 gAnimEntriesMax = 0.0
 
@@ -433,7 +434,8 @@ def run():
             if xShot.attrib.get('enabled', 'True') == 'False':
                 continue
             animations = {}
-            for xChannel in xShot:
+            xChannels = list(xShot)
+            for xChannel, data in zip(xChannels, readChannels(scenePath, [(xChannel.attrib, xChannel.text) for xChannel in xChannels])):
                 uname = xChannel.attrib['name']
                 n = uname
                 x = 0
@@ -443,19 +445,16 @@ def run():
                 n = text.addString(n)
                 if n not in animations:
                     animations[n] = []
-                if not xChannel.text:
-                    keyframes = []
-                else:
-                    keyframes = []
-                    for i, v in enumerate(float(v.strip()) for v in xChannel.text.split(',')):
-                        j = i % 8
-                        if j == 0 or j == 4 or j > 5:
-                            continue
-                        if j == 5: # out tangent y
-                            if v == float('inf'): # stepped tangents are implemented as out tangentY = positive infinity
-                                v = 'FLT_MAX'
-                        keyframes.append(v)
-                    assert len(keyframes) / 4.0 == int(len(keyframes) / 4), len(keyframes)
+                keyframes = []
+                for i, v in enumerate(data):
+                    j = i % 8
+                    if j == 0 or j == 4 or j > 5:
+                        continue
+                    if j == 5: # out tangent y
+                        if v == float('inf'): # stepped tangents are implemented as out tangentY = positive infinity
+                            v = 'FLT_MAX'
+                    keyframes.append(v)
+                assert len(keyframes) / 4.0 == int(len(keyframes) / 4), len(keyframes)
                 while len(animations[n]) <= x:
                     animations[n].append(None)
                 assert animations[n][x] is None
@@ -40,34 +40,35 @@ def rotateVec3(v, a):
 
 
 class Vec2(object):
+    __slots__ = ('x', 'y')
+
     def __init__(self, x, y=None):
         if isinstance(x, Vec2):
-            self.data = [x.x, x.y]
+            self.x = x.x
+            self.y = x.y
         else:
             assert isinstance(x, float) and isinstance(y, float), 'Error, invalid call to Vec2() can either be Vec2(Vec2) or Vec2(float, float)'
-            self.data = [x, y]
-
-    def __getitem__(self, i):
-        return self.data[i]
-
-    def __setitem__(self, i, v):
-        self.data[i] = v
+            self.x = x
+            self.y = y
 
     @property
-    def x(self):
-        return self.data[0]
+    def data(self):
+        return [self.x, self.y]
 
-    @x.setter
-    def x(self, v):
-        self.data[0] = v
+    @data.setter
+    def data(self, data):
+        self.x, self.y = data
 
-    @property
-    def y(self):
-        return self.data[1]
+    def __getitem__(self, i):
+        return (self.x, self.y)[i]
 
-    @y.setter
-    def y(self, v):
-        self.data[1] = v
+    def __setitem__(self, i, v):
+        if i in (0, -2):
+            self.x = v
+        elif i in (1, -1):
+            self.y = v
+        else:
+            raise IndexError('Vec2 index out of range')
 
     def __neg__(self):
         return Vec2(-self.x, -self.y)
@@ -79,11 +80,11 @@ class Vec2(object):
 
     def __iadd__(self, other):
         if isinstance(other, Vec2):
-            self.data[0] += other.data[0]
-            self.data[1] += other.data[1]
+            self.x += other.x
+            self.y += other.y
         else:
-            self.data[0] += other
-            self.data[1] += other
+            self.x += other
+            self.y += other
         return self
 
     def __sub__(self, other):
@@ -93,11 +94,11 @@ class Vec2(object):
 
     def __isub__(self, other):
         if isinstance(other, Vec2):
-            self.data[0] -= other.data[0]
-            self.data[1] -= other.data[1]
+            self.x -= other.x
+            self.y -= other.y
         else:
-            self.data[0] -= other
-            self.data[1] -= other
+            self.x -= other
+            self.y -= other
         return self
 
     def __mul__(self, other):
@@ -107,11 +108,11 @@ class Vec2(object):
 
     def __imul__(self, other):
         if isinstance(other, Vec2):
-            self.data[0] *= other.data[0]
-            self.data[1] *= other.data[1]
+            self.x *= other.x
+            self.y *= other.y
         else:
-            self.data[0] *= other
-            self.data[1] *= other
+            self.x *= other
+            self.y *= other
         return self
 
     def __div__(self, other):
@@ -121,15 +122,15 @@ class Vec2(object):
 
     def __idiv__(self, other):
         if isinstance(other, Vec2):
-            self.data[0] /= other.data[0]
-            self.data[1] /= other.data[1]
+            self.x /= other.x
+            self.y /= other.y
         else:
-            self.data[0] /= other
-            self.data[1] /= other
+            self.x /= other
+            self.y /= other
         return self
 
     def dot(self, other):
-        return self.data[0] * other.data[0] + self.data[1] * other.data[1]
+        return self.x * other.x + self.y * other.y
 
     def sqrLen(self):
         return self.dot(self)
@@ -138,7 +139,7 @@ class Vec2(object):
         return self.sqrLen() ** 0.5
 
     def abs(self):
-        return Vec2(abs(self.data[0]), abs(self.data[1]))
+        return Vec2(abs(self.x), abs(self.y))
 
     def normalized(self):
         f = self.length()
@@ -149,4 +150,4 @@ class Vec2(object):
         self /= f
 
     def __repr__(self):
-        return str('Vec2(%s, %s)' % (self.data[0], self.data[1]))
+        return str('Vec2(%s, %s)' % (self.x, self.y))
@@ -4,6 +4,47 @@ from qtutil import *
 from util import randomColor, gSettings
 
 
+class GLCallCounter(object):
+    """
+    Counts calls to GL functions, so the Profiler can show how many calls a frame takes.
+    Calls are only counted while enabled, otherwise the original functions are in place and counting costs nothing.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.__enabled = False
+        self.__functions = []  # (namespace, name, original function)
+
+    def countCalls(self, namespace, names):
+        """
+        While enabled, replace the GL functions with the given names in a module's namespace by versions that count their calls.
+        """
+        for name in names:
+            self.__functions.append((namespace, name, namespace[name]))
+            if self.__enabled:
+                namespace[name] = self.__counted(namespace[name])
+
+    def isEnabled(self):
+        return self.__enabled
+
+    def setEnabled(self, state):
+        if state == self.__enabled:
+            return
+        self.__enabled = state
+        for namespace, name, fn in self.__functions:
+            namespace[name] = self.__counted(fn) if state else fn
+
+    def __counted(self, fn):
+        def counted(*args, **kwargs):
+            self.count += 1
+            return fn(*args, **kwargs)
+
+        return counted
+
+
+gGLCalls = GLCallCounter()
+
+
 class _ProfileRenderer(QWidget):
     def __init__(self):
         super(_ProfileRenderer, self).__init__()
@@ -62,6 +103,7 @@ class Profiler(QWidget):
         h.addStretch()
         self._enabled.setChecked(gSettings.value('ProfilerEnabled', 'false') == 'true')
         self._enabled.toggled.connect(functools.partial(gSettings.setValue, 'ProfilerEnabled'))
+        self._enabled.toggled.connect(self.__updateGLCallCounting)
         h.addWidget(self._enabled)
         self.layout().addLayout(h)
         self.layout().addWidget(self._renderer)
@@ -72,6 +114,17 @@ class Profiler(QWidget):
     def isProfiling(self):
         return self._enabled.isChecked()
 
+    def __updateGLCallCounting(self, *args):
+        gGLCalls.setEnabled(self.isVisible() and self.isProfiling())
+
+    def showEvent(self, event):
+        super(Profiler, self).showEvent(event)
+        self.__updateGLCallCounting()
+
+    def hideEvent(self, event):
+        super(Profiler, self).hideEvent(event)
+        self.__updateGLCallCounting()
+
     def _setDebugPass(self, *args):
         if self._renderer.scene is not None:
             # TODO: should trigger a redraw
@@ -102,12 +155,15 @@ class Profiler(QWidget):
             for i, passData in enumerate(scene.passes):
                 self._passes.addItem(passData.name or ('(nameless pass %s)' % i))
 
-    def _update(self, lastFrameDuration):
+    def _update(self, lastFrameDuration, glCalls):
         self.frameTimes.append(lastFrameDuration)
         if len(self.frameTimes) > 10:
             self.frameTimes.pop(0)
         averageSecondsPerFrame = float(sum(self.frameTimes) / len(self.frameTimes))
-        self.parent().setWindowTitle('Profiler: %i FPS / %i ms' % (round(1.0 / averageSecondsPerFrame), round(averageSecondsPerFrame * 1000.0)))
+        title = 'Profiler: %i FPS / %i ms' % (round(1.0 / averageSecondsPerFrame), round(averageSecondsPerFrame * 1000.0))
+        if gGLCalls.isEnabled():
+            title += ' / %i GL calls' % glCalls
+        self.parent().setWindowTitle(title)
 
         if not self.isProfiling():
             return
@@ -0,0 +1,71 @@
+"""
+Snapshot of what sceneparse.scanScenes() read from the scene files of a project, stored in the user's cache folder,
+so reopening a project whose scene files did not change skips parsing them.
+
+Snapshots are written with marshal, which only stores plain data, and live outside the project folder,
+so a snapshot shared through version control can never be opened.
+"""
+import hashlib
+import marshal
+import os
+from sceneparse import fileStamp
+
+SNAPSHOT_EXT = '.snapshot'
+# increment whenever the layout of the snapshot or of the scanScenes() results changes
+SNAPSHOT_VERSION = 2
+
+
+def SnapshotsPath():
+    cachePath = os.environ.get('LOCALAPPDATA') or os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cachePath, 'SqrMelon', 'snapshots')
+
+
+def SnapshotFileForProject(projectFile):
+    path = os.path.normcase(os.path.abspath(projectFile))
+    if isinstance(path, unicode):
+        # project paths are unicode with the QString v2 api, md5 needs bytes
+        path = path.encode('utf-8')
+    key = hashlib.md5(path).hexdigest()
+    return os.path.join(SnapshotsPath(), key + SNAPSHOT_EXT)
+
+
+def readSnapshot(projectFile, sceneFiles):
+    """
+    The scanScenes() results stored by writeSnapshot(), or None when there is no valid snapshot:
+    it is of another version, was made for other scene files, or a file it was read from changed size or modification time.
+    The results are only read after the checks pass.
+    """
+    try:
+        with open(SnapshotFileForProject(projectFile).replace('\\', '/'), 'rb') as fh:
+            if marshal.load(fh) != SNAPSHOT_VERSION:
+                return None
+            if marshal.load(fh) != sceneFiles:
+                return None
+            for path, stamp in marshal.load(fh).iteritems():
+                if fileStamp(path) != stamp:
+                    return None
+            return marshal.load(fh)
+    except Exception as e:
+        # missing or damaged, it is only a cache
+        if not isinstance(e, IOError):
+            print 'Ignoring project snapshot: %s' % e
+        return None
+
+
+def writeSnapshot(projectFile, sceneFiles, results):
+    """
+    :param list sceneFiles: The files scanScenes() was called with.
+    :param list results: What scanScenes() returned.
+    """
+    sources = {}
+    for shots, sceneSources, seconds in results:
+        sources.update(sceneSources)
+    try:
+        filePath = SnapshotFileForProject(projectFile).replace('\\', '/')
+        if not os.path.exists(os.path.dirname(filePath)):
+            os.makedirs(os.path.dirname(filePath))
+        with open(filePath, 'wb') as fh:
+            for data in (SNAPSHOT_VERSION, sceneFiles, sources, results):
+                marshal.dump(data, fh)
+    except (IOError, OSError) as e:
+        print 'Could not write project snapshot: %s' % e
@@ -3,7 +3,7 @@ import re
 import time
 from collections import OrderedDict
 from fileutil import FileSystemWatcher
-from profileui import Profiler
+from profileui import Profiler, gGLCalls
 
 from OpenGL.GL import shaders
 from OpenGL.GL.EXT import texture_filter_anisotropic
@@ -14,6 +14,12 @@ from qtutil import *
 from util import TemplateForScene, ProjectFile, ParseXMLWithIncludes
 from gl_shaders import compileProgram
 
+# count the GL calls made while drawing when the profiler asks for it, see Scene.draw()
+gGLCalls.countCalls(globals(), ('glActiveTexture', 'glBindTexture', 'glBindVertexArray', 'glClear', 'glDisable', 'glDrawArrays', 'glEnable',
+                                'glGenerateMipmap', 'glGetTexImage', 'glGetUniformLocation', 'glTexParameterf', 'glTexParameteri',
+                                'glUniform1f', 'glUniform1i', 'glUniform2f', 'glUniform3f', 'glUniform4f', 'glUniformMatrix3fv',
+                                'glUniformMatrix4fv', 'glUseProgram', 'glViewport'))
+
 
 class TexturePool(object):
     """
@@ -204,6 +210,7 @@ class CameraTransform(object):
 class _ShaderPool(object):
     def __init__(self):
         self.__cache = {}
+        self.__locations = {}  # see uniformLocations()
 
     def compileProgram(self, vertCode, fragCode):
         """
@@ -221,8 +228,33 @@ class _ShaderPool(object):
             validate=validate
         )
         self.__cache[(vertCode, fragCode)] = program
+        self.__locations[program] = self.__reflectUniforms(program)
         return program
 
+    @staticmethod
+    def __reflectUniforms(program):
+        locations = {}
+        for index in xrange(int(glGetProgramiv(program, GL_ACTIVE_UNIFORMS))):
+            name, size, uniformType = glGetActiveUniform(program, index)
+            if name.startswith('gl_'):
+                continue
+            names = [name]
+            if name.endswith('[0]'):
+                names = [name[:-3]] + ['%s[%s]' % (name[:-3], i) for i in xrange(size)]
+            for name in names:
+                location = glGetUniformLocation(program, name)
+                if location != -1:
+                    locations[name] = location
+        return locations
+
+    def uniformLocations(self, program):
+        """
+        Location per uniform name of a program from compileProgram(), read once after linking.
+        Arrays have an entry per element, e.g. "uImages[1]", and one for the array name.
+        Uniforms the shader compiler removed are missing, so they can be skipped without asking the driver.
+        """
+        return self.__locations[program]
+
 
 gShaderPool = _ShaderPool()
 
@@ -278,7 +310,7 @@ class Scene(object):
 
         colorBuffer.use()
 
-        glUniform1i(glGetUniformLocation(passThrough, 'uImages[0]'), 0)
+        glUniform1i(gShaderPool.uniformLocations(passThrough)['uImages[0]'], 0)
         glViewport(*viewport)
 
         FullScreenRectSingleton.instance().draw()
@@ -297,7 +329,7 @@ class Scene(object):
     def usePassThroughProgram(cls, color=(1.0, 1.0, 1.0, 1.0)):
         passThrough = cls.getPassThroughProgram()
         glUseProgram(passThrough)
-        glUniform4f(glGetUniformLocation(passThrough, 'uColor'), *color)
+        glUniform4f(gShaderPool.uniformLocations(passThrough)['uColor'], *color)
         return passThrough
 
     @classmethod
@@ -554,7 +586,8 @@ class Scene(object):
         j = 0
 
         # pull all textures in advance to avoid custom mip map shaders overriding the currently set up inputs
-        program = glGetIntegerv(GL_CURRENT_PROGRAM)
+        program = self.shaders[passId]
+        locations = gShaderPool.uniformLocations(program)
         for j, inpt in enumerate(self.passes[passId].inputBufferIds):
             if isinstance(inpt, str):
                 TexturePool.fetchAndUse(inpt)
@@ -569,7 +602,8 @@ class Scene(object):
             if isinstance(inpt, str):
                 # input is texture file name
                 TexturePool.fetchAndUse(inpt)
-                glUniform1i(glGetUniformLocation(self.shaders[passId], 'uImages[%s]' % j2d), j)
+                if 'uImages[%s]' % j2d in locations:
+                    glUniform1i(locations['uImages[%s]' % j2d], j)
                 j2d += 1
                 continue
 
@@ -580,18 +614,21 @@ class Scene(object):
                 raise IndexError('Template for current scene has inputs fetching from non-existant buffers.')
             inputBuffer.use()
             if isinstance(inputBuffer, Texture3D):
-                glUniform1i(glGetUniformLocation(self.shaders[passId], 'uImages3D[%s]' % j3d), j)
+                name = 'uImages3D[%s]' % j3d
                 j3d += 1
             else:
-                glUniform1i(glGetUniformLocation(self.shaders[passId], 'uImages[%s]' % j2d), j)
+                name = 'uImages[%s]' % j2d
                 j2d += 1
+            if name in locations:
+                glUniform1i(locations[name], j)
 
         if additionalTextureUniforms:
             for name in additionalTextureUniforms:
                 j += 1
                 glActiveTexture(GL_TEXTURE0 + j)
                 TexturePool.fetchAndUse(additionalTextureUniforms[name])
-                glUniform1i(glGetUniformLocation(self.shaders[passId], name), j)
+                if name in locations:
+                    glUniform1i(locations[name], j)
 
         return j + 1
 
@@ -633,6 +670,7 @@ class Scene(object):
             return
 
         isProfiling = Profiler.instance and Profiler.instance.isVisible() and Profiler.instance.isProfiling() and self._debugPassId is None
+        glCalls = gGLCalls.count
         if isProfiling:
             self.profileLog = []
             glFinish()
@@ -673,30 +711,36 @@ class Scene(object):
             self.frameBuffers[passData.targetBufferId].use()
 
             glUseProgram(self.shaders[i])
+            locations = gShaderPool.uniformLocations(self.shaders[i])
 
             activeInputs = self._bindInputs(i, additionalTextureUniforms)
 
+            # uniforms the shader does not use are skipped
             fn = (glUniform1f, glUniform2f, glUniform3f, glUniform4f)
             for name in uniforms:
+                if name not in locations:
+                    continue
                 if isinstance(uniforms[name], (int, long)):
                     glActiveTexture(GL_TEXTURE0 + activeInputs)
                     glBindTexture(GL_TEXTURE_2D, uniforms[name])
-                    glUniform1i(glGetUniformLocation(self.shaders[i], name), activeInputs)
+                    glUniform1i(locations[name], activeInputs)
                     activeInputs += 1
                 elif isinstance(uniforms[name], float):
-                    fn[0](glGetUniformLocation(self.shaders[i], name), uniforms[name])
+                    fn[0](locations[name], uniforms[name])
                 elif len(uniforms[name]) == 9:
-                    glUniformMatrix3fv(glGetUniformLocation(self.shaders[i], name), 1, False, (ctypes.c_float * 9)(*uniforms[name]))
+                    glUniformMatrix3fv(locations[name], 1, False, (ctypes.c_float * 9)(*uniforms[name]))
                 elif len(uniforms[name]) == 16:
-                    glUniformMatrix4fv(glGetUniformLocation(self.shaders[i], name), 1, False, (ctypes.c_float * 16)(*uniforms[name]))
+                    glUniformMatrix4fv(locations[name], 1, False, (ctypes.c_float * 16)(*uniforms[name]))
                 else:
-                    fn[len(uniforms[name]) - 1](glGetUniformLocation(self.shaders[i], name), *uniforms[name])
+                    fn[len(uniforms[name]) - 1](locations[name], *uniforms[name])
 
             for name in passData.uniforms:
+                if name not in locations:
+                    continue
                 if isinstance(passData.uniforms[name], float):
-                    fn[0](glGetUniformLocation(self.shaders[i], name), passData.uniforms[name])
+                    fn[0](locations[name], passData.uniforms[name])
                 else:
-                    fn[len(passData.uniforms[name]) - 1](glGetUniformLocation(self.shaders[i], name), *passData.uniforms[name])
+                    fn[len(passData.uniforms[name]) - 1](locations[name], *passData.uniforms[name])
 
             maxActiveInputs = max(maxActiveInputs, activeInputs)
 
@@ -747,6 +791,6 @@ class Scene(object):
             glFinish()
         # inform the profiler a new result is ready
         endT = time.clock()
-        self.profileInfoChanged.emit(endT - startT)
+        self.profileInfoChanged.emit(endT - startT, gGLCalls.count - glCalls)
 
         return maxActiveInputs
@@ -4,6 +4,7 @@ Widget that manages & displays the list of scenes and editable shader sections i
 import fileutil
 from util import *
 import icons
+from sceneparse import ChannelsFileForScene
 from send2trash import send2trash
 import subprocess
 
@@ -138,6 +139,9 @@ class SceneList(QWidget):
             sceneDir = os.path.join(ScenesPath(), sceneName)
             sceneFile = sceneDir + SCENE_EXT
             send2trash(sceneFile)
+            channelsFile = ChannelsFileForScene(sceneFile)
+            if os.path.exists(channelsFile):
+                send2trash(channelsFile)
             send2trash(sceneDir)
         rows.sort()
         for row in rows[::-1]:
@@ -0,0 +1,238 @@
+"""
+Scene file reading and writing that needs no Qt, so it can run in worker processes.
+Results are plain data, the Shot and Curve objects are made by the caller.
+"""
+import multiprocessing
+import os
+import re
+import sys
+import time
+import types
+from array import array
+from xml.etree import cElementTree
+
+# below this many files starting worker processes takes longer than parsing
+POOL_THRESHOLD = 8
+CHANNELS_EXT = '.channels'
+
+
+def ReadXMLWithIncludes(xmlFilePath, includes=None):
+    """
+    :param list includes: Optional list the paths of the included files are appended to.
+    """
+    with open(xmlFilePath.replace('\\', '/')) as fh:
+        text = fh.read()
+
+    subs = []
+    for result in re.finditer(r'<!--[ \t]*#[ \t]*include[ \t]+(.+)[ \t]*-->', text):
+        inline = result.group(1).strip()
+        inlinePath = os.path.join(os.path.dirname(xmlFilePath), inline).replace('\\', '/')
+        if includes is not None:
+            includes.append(inlinePath)
+        with open(inlinePath) as fh:
+            inlineText = fh.read()
+        subs.append((result.start(0), result.end(0), inlineText))
+
+    for start, end, repl in reversed(subs):
+        text = '{}{}{}'.format(text[:start], repl, text[end:])
+
+    return text
+
+
+class _LineFilter(object):
+    """
+    File wrapper that drops empty and whitespace-only lines, lines are separated by \n without a trailing one.
+    """
+
+    def __init__(self, fh):
+        self.__fh = fh
+        self.__line = []
+        self.__empty = True
+
+    def write(self, data):
+        if isinstance(data, unicode):
+            data = data.encode('utf-8')
+        lines = data.replace('\r', '\n').split('\n')
+        self.__line.append(lines[0])
+        for line in lines[1:]:
+            self.__flush()
+            self.__line = [line]
+
+    def __flush(self):
+        line = ''.join(self.__line)
+        if not line.strip():
+            return
+        if not self.__empty:
+            self.__fh.write('\n')
+        self.__empty = False
+        self.__fh.write(line)
+
+    def close(self):
+        self.__flush()
+        self.__line = []
+
+
+def _escapeXml(text):
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('"', '&quot;').replace('>', '&gt;')
+
+
+def _writePrettyElement(writer, xElement, indent):
+    writer.write('%s<%s' % (indent, xElement.tag))
+    for name, value in sorted(xElement.attrib.iteritems()):
+        # the XML parser turned these into spaces when the text was parsed again to be pretty printed
+        value = value.replace('\r\n', ' ').replace('\r', ' ').replace('\t', ' ')
+        writer.write(' %s="%s"' % (name, _escapeXml(value)))
+    if not len(xElement):
+        if xElement.text:
+            writer.write('>%s</%s>\n' % (_escapeXml(xElement.text), xElement.tag))
+        else:
+            writer.write('/>\n')
+        return
+    writer.write('>\n')
+    childIndent = indent + '\t'
+    if xElement.text:
+        writer.write(_escapeXml('%s%s\n' % (childIndent, xElement.text)))
+    for xChild in xElement:
+        _writePrettyElement(writer, xChild, childIndent)
+        if xChild.tail:
+            writer.write(_escapeXml('%s%s\n' % (childIndent, xChild.tail)))
+    writer.write('%s</%s>\n' % (indent, xElement.tag))
+
+
+def writePrettyXml(xRoot, fh):
+    """
+    Write the element tree indented by tabs, in the format of xml.dom.minidom's toprettyxml()
+    without the whitespace-only lines it leaves. Elements are written as they are visited,
+    so no text or DOM of the whole document is built. The root element's text is cleared.
+    """
+    xRoot.text = None
+    writer = _LineFilter(fh)
+    writer.write('<?xml version="1.0" ?>\n')
+    _writePrettyElement(writer, xRoot, '')
+    writer.close()
+
+
+def ChannelsFileForScene(sceneFile):
+    """
+    Binary file next to the scene file with the key data of its channels, as little endian float64.
+    """
+    return os.path.splitext(sceneFile)[0] + CHANNELS_EXT
+
+
+def readChannels(sceneFile, channels):
+    """
+    Key data of Channel elements, each an array of 8 values per key in the channel layout.
+    Channels with an offset and count attribute are read straight from the scene's channels file,
+    others are parsed from their text.
+
+    :param channels: The attributes and text of each Channel element.
+    """
+    result = []
+    fh = None
+    try:
+        for attrib, text in channels:
+            data = array('d')
+            if 'offset' in attrib:
+                if fh is None:
+                    fh = open(ChannelsFileForScene(sceneFile).replace('\\', '/'), 'rb')
+                fh.seek(int(attrib['offset']) * data.itemsize)
+                data.fromfile(fh, int(attrib['count']))
+                if sys.byteorder == 'big':
+                    data.byteswap()
+            elif text:
+                data = array('d', map(float, text.split(',')))
+            result.append(data)
+    finally:
+        if fh is not None:
+            fh.close()
+    return result
+
+
+class _ShotScanner(object):
+    """
+    XMLParser target that collects the shots in a scene file as plain data, so it can be stored in a project snapshot:
+    the attributes of each shot and the tag, attributes and text of each of its elements.
+    Channel text is kept as is, the floats are parsed when the shot is loaded.
+    """
+
+    def __init__(self):
+        self.shots = []
+        self.__depth = 0
+        self.__attrib = None
+        self.__text = []
+
+    def start(self, tag, attrib):
+        if self.__depth == 1:
+            self.shots.append((attrib, []))
+        elif self.__depth == 2:
+            self.__attrib = attrib
+            self.__text = []
+        self.__depth += 1
+
+    def end(self, tag):
+        self.__depth -= 1
+        if self.__depth == 2:
+            self.shots[-1][1].append((tag, self.__attrib, ''.join(self.__text) or None))
+
+    def data(self, data):
+        if self.__depth == 3:
+            self.__text.append(data)
+
+    def close(self):
+        return self.shots
+
+
+def fileStamp(filePath):
+    """
+    Size and modification time of a file, None if it does not exist.
+    """
+    try:
+        info = os.stat(filePath.replace('\\', '/'))
+    except OSError:
+        return None
+    return info.st_size, info.st_mtime
+
+
+def scanSceneShots(sceneFile):
+    """
+    :returns: The shots in the scene file as (attributes, [(tag, attributes, text)]),
+    the fileStamp() of each file they were read from by path and the time it took in seconds.
+    """
+    start = time.time()
+    paths = [sceneFile, ChannelsFileForScene(sceneFile)]
+    sources = dict((path, fileStamp(path)) for path in paths)
+    parser = cElementTree.XMLParser(target=_ShotScanner())
+    parser.feed(ReadXMLWithIncludes(sceneFile, paths))
+    for path in paths[2:]:
+        sources[path] = fileStamp(path)
+    return parser.close(), sources, time.time() - start
+
+
+def _startPool():
+    """
+    Windows starts each worker by importing the main script of the parent, which for the app is the whole Qt application.
+    While the workers start the main module is replaced by one pointing at this file, so they only import this module.
+    """
+    mainModule = sys.modules['__main__']
+    workerMain = types.ModuleType('__main__')
+    workerMain.__file__ = os.path.abspath(__file__)
+    sys.modules['__main__'] = workerMain
+    try:
+        return multiprocessing.Pool()
+    finally:
+        sys.modules['__main__'] = mainModule
+
+
+def scanScenes(sceneFiles):
+    """
+    scanSceneShots() for each file, spread over a process per core when there are enough files.
+    :returns: A list with the result for each file.
+    """
+    if len(sceneFiles) < POOL_THRESHOLD or multiprocessing.cpu_count() < 2:
+        return [scanSceneShots(sceneFile) for sceneFile in sceneFiles]
+    pool = _startPool()
+    try:
+        return pool.map(scanSceneShots, sceneFiles)
+    finally:
+        pool.close()
+        pool.join()
@@ -1,12 +1,20 @@
 from qtutil import *
 import icons
 import fileutil
+import sys
+import time
+import functools
+from contextlib import contextmanager
 from textures import TextureManager
-from animationgraph.curvedata import Curve, Key
+from animationgraph.curvedata import Curve, CurveGroup, Key
+from bisect import bisect_right
 from collections import OrderedDict
+from array import array
 from scene import Scene
+from sceneparse import scanScenes, readChannels, ChannelsFileForScene
+from projectsnapshot import readSnapshot, writeSnapshot
 from xml.etree import cElementTree
-from util import randomColor, ScenesPath, ParseXMLWithIncludes, toPrettyXml, SCENE_EXT, ProjectFile, Scenes, TemplatesPath
+from util import randomColor, ScenesPath, ParseXMLWithIncludes, writePrettyXml, SCENE_EXT, ProjectFile, Scenes, TemplatesPath, gSettings
 
 
 def readChannelTemplates():
@@ -40,7 +48,10 @@ def readChannelTemplates():
 
 
 class Shot(object):
-    def __init__(self, name, sceneName, start=0.0, end=1.0, curves=None, textures=None, speed=1.0, preroll=0.0):
+    def __init__(self, name, sceneName, start=0.0, end=1.0, curves=None, textures=None, speed=1.0, preroll=0.0, loader=None):
+        """
+        :param loader: Optional function returning the curves and textures, called when they are first needed.
+        """
         self.items = [QStandardItem(name),
                       QStandardItem(sceneName),
                       QStandardItem(str(start)),
@@ -48,13 +59,62 @@ class Shot(object):
                       QStandardItem(str(end - start)),
                       QStandardItem(str(speed)),
                       QStandardItem(str(preroll))]
-        self.curves = curves or OrderedDict()
-        self.textures = textures or OrderedDict()
+        self.__curves = curves or OrderedDict()
+        self.__textures = textures or OrderedDict()
+        self.__loader = loader
         self.color = QColor.fromRgb(*randomColor())
         self.items[0].setData(self, Qt.UserRole + 1)
         self._enabled = True
         self._pinned = False
         self.items[0].setIcon(icons.get('Checked Checkbox'))
+        # what was last saved, see isModified(), new shots have never been saved
+        self.__savedState = None
+        if loader is None:
+            self.updateChannelLayout()
+
+    def isLoaded(self):
+        return self.__loader is None
+
+    def __load(self):
+        if self.__loader is None:
+            return
+        loader = self.__loader
+        self.__loader = None
+        self.__curves, self.__textures = loader()
+        self.updateChannelLayout()
+        if self.__savedState is not None:
+            # the curves and textures are as saved until they are edited
+            self.__savedState = self.__savedState[0], self.__contentState()
+
+    def __contentState(self):
+        return [(name, curve, curve.revision()) for name, curve in self.__curves.iteritems()], self.__textures.items()
+
+    def __state(self):
+        attributes = tuple(item.text() for item in self.items), self._enabled
+        if not self.isLoaded():
+            # can not have been edited
+            return attributes, None
+        return attributes, self.__contentState()
+
+    def isModified(self):
+        """
+        Whether anything that is saved to the scene file changed since markSaved().
+        Follows the item texts, the curve revisions and the textures, so no edit has to report itself.
+        """
+        return self.__state() != self.__savedState
+
+    def markSaved(self):
+        self.__savedState = self.__state()
+
+    @property
+    def curves(self):
+        self.__load()
+        return self.__curves
+
+    @property
+    def textures(self):
+        self.__load()
+        return self.__textures
 
     @property
     def enabled(self):
@@ -86,52 +146,125 @@ class Shot(object):
             else:
                 self.items[0].setIcon(icons.get('Checked Checkbox'))
 
-    def evaluate(self, time):
-        time -= self.start
-        time *= self.speed
-        time -= self.preroll
-        data = {}
-        for name in self.curves:
-            value = self.curves[name].evaluate(time)
+    def updateChannelLayout(self):
+        """
+        Compile the channel names into the plan evaluate() follows, call whenever channels are added, removed or replaced.
+
+        "name.x" to "name.w" channels fill a list per uniform, other channels are float uniforms.
+        Complete vec2 to vec4 uniforms are evaluated as a CurveGroup, which needs one segment search per uniform.
+        """
+        self.__output = {}
+        self.__groups = []  # (uniform name, CurveGroup)
+        self.__components = []  # (curve, output list, component index)
+        self.__ungrouped = []  # the components that are not part of a group
+        self.__ungroupedVectors = []  # names of the vector uniforms that are not evaluated as a group
+        self.__scalars = []  # (uniform name, curve)
+        self.__vectors = []  # (uniform name, size, [(curve, component index)])
+
+        channels = OrderedDict()
+        for name, curve in self.curves.iteritems():
             if '.' in name:
                 name, channel = name.split('.', 1)
-                if name in data:
-                    data[name][channel] = value
-                else:
-                    data[name] = {channel: value}
+                channels.setdefault(name, {})[channel] = curve
             else:
-                assert name not in data
-                data[name] = value
-        for name in data:
-            if isinstance(data[name], dict):
-                v = data[name]
-                if 'w' in v:
-                    data[name] = [v['x'],
-                                  v['y'],
-                                  v['z'],
-                                  v['w']]
-                elif 'z' in v:
-                    data[name] = [v['x'],
-                                  v['y'],
-                                  v['z']]
-                elif 'y' in v:
-                    data[name] = [v['x'],
-                                  v['y']]
-                else:
-                    data[name] = [v['x']]
+                assert name not in self.__output
+                self.__output[name] = 0.0
+                self.__scalars.append((name, curve))
+
+        for name, components in channels.iteritems():
+            assert name not in self.__output
+            size = 4 if 'w' in components else 3 if 'z' in components else 2 if 'y' in components else 1
+            order = ('x', 'y', 'z', 'w')[:size]
+            grouped = size > 1 and set(components) == set(order)
+            if grouped:
+                self.__groups.append((name, CurveGroup([components[component] for component in order])))
+            else:
+                self.__ungroupedVectors.append(name)
+            buffer = [0.0] * size
+            self.__output[name] = buffer
+            self.__vectors.append((name, size, []))
+            for channel, curve in components.iteritems():
+                if channel in order:
+                    self.__components.append((curve, buffer, order.index(channel)))
+                    self.__vectors[-1][2].append((curve, order.index(channel)))
+                    if not grouped:
+                        self.__ungrouped.append(self.__components[-1])
+
+    def evaluate(self, time, baked=False):
+        """
+        Uniform values at the given time, following the plan made by updateChannelLayout().
+        The result is new, so callers can change it without affecting later calls.
+
+        :param bool baked: Use the curves' lookup tables, see Curve.bakeTable(). Otherwise vector uniforms are evaluated per CurveGroup.
+        """
+        self.__load()
+        time -= self.start
+        time *= self.speed
+        time -= self.preroll
+        output = self.__output
+        if baked:
+            for curve, buffer, index in self.__components:
+                buffer[index] = curve.evaluateBaked(time)
+            for name, curve in self.__scalars:
+                output[name] = curve.evaluateBaked(time)
+            data = dict(output)
+            for name, size, components in self.__vectors:
+                data[name] = list(data[name])
+            return data
+
+        for curve, buffer, index in self.__ungrouped:
+            buffer[index] = curve.evaluate(time)
+        for name, curve in self.__scalars:
+            output[name] = curve.evaluate(time)
+        data = dict(output)
+        for name in self.__ungroupedVectors:
+            data[name] = list(data[name])
+        for name, group in self.__groups:
+            data[name] = group.evaluate(time)
         return data
 
+    def evaluateMany(self, times):
+        """
+        Uniform values at each of the given times, a list with what evaluate() returns for each time.
+        Every curve is evaluated for the whole block at once with Curve.evaluateMany(),
+        so for ascending times (as used to record) each curve walks its keys only once.
+        """
+        self.__load()
+        start = self.start
+        speed = self.speed
+        preroll = self.preroll
+        localTimes = [(time - start) * speed - preroll for time in times]
+        result = [{} for _ in localTimes]
+        for name, curve in self.__scalars:
+            for data, value in zip(result, curve.evaluateMany(localTimes)):
+                data[name] = value
+        for name, size, components in self.__vectors:
+            vectors = [[0.0] * size for _ in localTimes]
+            for curve, index in components:
+                for vector, value in zip(vectors, curve.evaluateMany(localTimes)):
+                    vector[index] = value
+            for data, vector in zip(result, vectors):
+                data[name] = vector
+        return result
+
+    def revision(self):
+        """
+        Value that changes whenever evaluate() may return something else, for caches of evaluated uniforms.
+        """
+        return self.start, self.speed, self.preroll, [(name, curve, curve.revision()) for name, curve in self.curves.iteritems()]
+
     def bake(self):
         speed = self.speed
         start = self.start
         end = self.end
         for name in self.curves:
-            # offset our keys by our preroll time
-            self.curves[name].move(self.preroll)
-            # scale curves so we can set our speed to 1
-            self.curves[name].scale(speed)
-            # delete keys outside time range
-            self.curves[name].trim(start, end)
+            with self.curves[name].edit() as curve:
+                # offset our keys by our preroll time
+                curve.move(self.preroll)
+                # scale curves so we can set our speed to 1
+                curve.scale(speed)
+                # delete keys outside time range
+                curve.trim(start, end)
         self.speed = 1.0
         self.preroll = 0.0
 
@@ -229,60 +362,72 @@ class FloatItemDelegate(QItemDelegate):
         self.closeEditor.emit(self.__editor, QAbstractItemDelegate.NoHint)
 
 
-def _deserializeSceneShots(sceneName):
+def _deserializeShotData(sceneFile, elements):
+    """
+    Curves and textures of a shot from the (tag, attributes, text) of its elements, see sceneparse.scanSceneShots().
+    """
+    channels = [(attrib, text) for tag, attrib, text in elements if tag.lower() == 'channel']
+    curves = OrderedDict()
+    for (attrib, text), keys in zip(channels, readChannels(sceneFile, channels)):
+        curves[attrib['name']] = Curve.fromPacked(keys)
+    textures = OrderedDict()
+    for tag, attrib, text in elements:
+        if tag.lower() == 'texture':
+            textures[attrib['name']] = attrib['path']
+    return curves, textures
+
+
+def _deserializeSceneShots(sceneName, sceneShots):
+    """
+    Shots from the data found by sceneparse.scanSceneShots(), their curves and textures are only loaded when first used.
+    """
     sceneFile = os.path.join(ScenesPath(), sceneName + SCENE_EXT)
-    xScene = ParseXMLWithIncludes(sceneFile)
-
-    for xShot in xScene:
-        name = xShot.attrib['name']
-        start = float(xShot.attrib['start'])
-        end = float(xShot.attrib['end'])
-        speed = float(xShot.attrib.get('speed', 1.0))  # using get for legacy file support
-        preroll = float(xShot.attrib.get('preroll', 0.0))
-
-        curves = OrderedDict()
-        textures = OrderedDict()
-        for xEntry in xShot:
-            if xEntry.tag.lower() == 'channel':
-                curveName = xEntry.attrib['name']
-                keys = []
-                if xEntry.text:
-                    keys = xEntry.text.split(',')
-                curve = Curve()
-                for i in range(0, len(keys), 8):
-                    curve.addKeyWithTangents(tangentBroken=int(keys[i + 6]), tangentMode=int(keys[i + 7]), *[float(x) for x in keys[i:i + 6]])
-                curves[curveName] = curve
-
-            if xEntry.tag.lower() == 'texture':
-                textures[xEntry.attrib['name']] = xEntry.attrib['path']
-
-        shot = Shot(name, sceneName, start, end, curves, textures, speed, preroll)
-        if 'enabled' in xShot.attrib:
-            shot.enabled = xShot.attrib['enabled'] == str(True)
+    for attrib, elements in sceneShots:
+        name = attrib['name']
+        start = float(attrib['start'])
+        end = float(attrib['end'])
+        speed = float(attrib.get('speed', 1.0))  # using get for legacy file support
+        preroll = float(attrib.get('preroll', 0.0))
+
+        shot = Shot(name, sceneName, start, end, speed=speed, preroll=preroll, loader=functools.partial(_deserializeShotData, sceneFile, elements))
+        if 'enabled' in attrib:
+            shot.enabled = attrib['enabled'] == str(True)
+        shot.markSaved()
         yield shot
 
 
-def _saveSceneShots(sceneName, shots):
-    sceneFile = os.path.join(ScenesPath(), sceneName + SCENE_EXT)
-    xScene = ParseXMLWithIncludes(sceneFile)
-
-    # save user camera position per scene
+def _saveUserFile(sceneNames):
+    """
+    Save the user camera position of each scene to the project's .user file.
+    """
     userFile = ProjectFile() + '.user'
     if fileutil.exists(userFile):
         xUser = ParseXMLWithIncludes(userFile)
     else:
         xUser = cElementTree.Element('user')
-    if sceneFile in Scene.cache:
+    for sceneName in sceneNames:
+        sceneFile = os.path.join(ScenesPath(), sceneName + SCENE_EXT)
+        if sceneFile not in Scene.cache:
+            continue
         cameraData = Scene.cache[sceneFile].cameraData()
-        if cameraData:
-            for xSub in xUser:
-                if xSub.tag == 'scene' and xSub.attrib['name'] == sceneName:
-                    xSub.attrib['camera'] = ','.join([str(x) for x in cameraData])
-                    break
-            else:
-                cElementTree.SubElement(xUser, 'scene', {'name': sceneName, 'camera': ','.join([str(x) for x in cameraData])})
+        if not cameraData:
+            continue
+        for xSub in xUser:
+            if xSub.tag == 'scene' and xSub.attrib['name'] == sceneName:
+                xSub.attrib['camera'] = ','.join([str(x) for x in cameraData])
+                break
+        else:
+            cElementTree.SubElement(xUser, 'scene', {'name': sceneName, 'camera': ','.join([str(x) for x in cameraData])})
     with fileutil.edit(userFile) as fh:
-        fh.write(toPrettyXml(xUser))
+        writePrettyXml(xUser, fh)
+
+
+def _saveSceneShots(sceneName, shots, binaryChannels=False):
+    """
+    :param bool binaryChannels: Write the key data to the scene's channels file instead of the XML, see sceneparse.readChannels().
+    """
+    sceneFile = os.path.join(ScenesPath(), sceneName + SCENE_EXT)
+    xScene = ParseXMLWithIncludes(sceneFile)
 
     # remove old shots
     r = []
@@ -296,11 +441,18 @@ def _saveSceneShots(sceneName, shots):
         if shot.sceneName == sceneName:
             targets.append(shot)
 
+    channelData = array('d')
     for shot in targets:
         xShot = cElementTree.SubElement(xScene, 'Shot', {'name': shot.name, 'scene': sceneName, 'start': str(shot.start), 'end': str(shot.end), 'enabled': str(shot.enabled), 'speed': str(shot.speed),
                                                          'preroll': str(shot.preroll)})
         for curveName in shot.curves:
             xChannel = cElementTree.SubElement(xShot, 'Channel', {'name': curveName, 'mode': 'hermite'})
+            if binaryChannels:
+                data = shot.curves[curveName].packed()
+                xChannel.attrib['offset'] = str(len(channelData))
+                xChannel.attrib['count'] = str(len(data))
+                channelData.extend(data)
+                continue
             data = []
             for key in shot.curves[curveName]:
                 data.append(str(key.inTangent.x))
@@ -315,8 +467,17 @@ def _saveSceneShots(sceneName, shots):
         for texName in shot.textures:
             cElementTree.SubElement(xShot, 'Texture', {'name': texName, 'path': shot.textures[texName]})
 
+    channelsFile = ChannelsFileForScene(sceneFile)
+    if binaryChannels:
+        if sys.byteorder == 'big':
+            channelData.byteswap()
+        with fileutil.edit(channelsFile, 'wb') as fh:
+            channelData.tofile(fh)
+    elif fileutil.exists(channelsFile):
+        os.remove(channelsFile)
+
     with fileutil.edit(sceneFile) as fh:
-        fh.write(toPrettyXml(xScene))
+        writePrettyXml(xScene, fh)
 
 
 class ShotView(QTableView):
@@ -326,8 +487,12 @@ class ShotView(QTableView):
     shotsDisabled = pyqtSignal(list)
     findSceneRequest = pyqtSignal(str)
 
-    def __init__(self):
+    def __init__(self, batchChanges):
+        """
+        :param batchChanges: ShotManager.batchChanges(), to change many shots at once.
+        """
         super(ShotView, self).__init__()
+        self.__batchChanges = batchChanges
         self.__menu = QMenu()
         self.__menu.addAction(icons.get('Visible'), 'View').triggered.connect(self.__onViewShot)
         self.__menu.addAction(icons.get('Pin'), 'Pin').triggered.connect(self.onPinShot)
@@ -366,34 +531,53 @@ class ShotView(QTableView):
         self.shotsEnabled.emit([item.data(Qt.UserRole + 1)])
         self.pinShotAction.emit(item.data(Qt.UserRole + 1))
 
+    def __selectedShots(self):
+        return [self.model().item(index.row(), 0).data(Qt.UserRole + 1) for index in self.selectionModel().selectedRows()]
+
     def __onEnableShot(self):
-        shots = []
-        for index in self.selectionModel().selectedRows():
-            item = self.model().item(index.row(), 0)
-            shot = item.data(Qt.UserRole + 1)
-            shots.append(shot)
-            shot.enabled = True
+        shots = self.__selectedShots()
+        with self.__batchChanges():
+            for shot in shots:
+                shot.enabled = True
         self.shotsEnabled.emit(shots)
 
     def __onDisableShot(self):
-        shots = []
-        for index in self.selectionModel().selectedRows():
-            item = self.model().item(index.row(), 0)
-            shot = item.data(Qt.UserRole + 1)
-            shots.append(shot)
-            shot.enabled = False
-            shot.pinned = False
+        shots = self.__selectedShots()
+        with self.__batchChanges():
+            for shot in shots:
+                shot.enabled = False
+                shot.pinned = False
         self.shotsDisabled.emit(shots)
 
 
 class ShotModel(QSortFilterProxyModel):
+    def __init__(self):
+        super(ShotModel, self).__init__()
+        self.__sortKeys = {}  # number per cell text, None if the text is not a number
+
+    def __sortKey(self, value):
+        try:
+            return self.__sortKeys[value]
+        except KeyError:
+            pass
+        try:
+            key = float(value)
+        except (ValueError, TypeError):
+            key = None
+        if len(self.__sortKeys) > 4096:
+            # edited values pile up
+            self.__sortKeys.clear()
+        self.__sortKeys[value] = key
+        return key
+
     def lessThan(self, lhs, rhs):
         lv = lhs.data()
         rv = rhs.data()
-        try:
-            return float(lv) < float(rv)
-        except (ValueError, TypeError):
+        lk = self.__sortKey(lv)
+        rk = self.__sortKey(rv)
+        if lk is None or rk is None:
             return lv < rv
+        return lk < rk
 
     def item(self, row, col=0):
         return self.sourceModel().itemFromIndex(self.mapToSource(self.index(row, col)))
@@ -410,6 +594,12 @@ class ShotItemModel(QStandardItemModel):
 class ShotManager(QWidget):
     currentChanged = pyqtSignal(Shot)
     shotPinned = pyqtSignal(Shot)
+    # shots were added, removed or edited, emitted once at the end of batchChanges()
+    shotsChanged = pyqtSignal()
+
+    # lookup table settings for baked playback, in samples per beat and maximum error
+    BAKE_RATE = 60.0
+    BAKE_TOLERANCE = 1e-4
 
     def __init__(self):
         super(ShotManager, self).__init__()
@@ -438,7 +628,9 @@ class ShotManager(QWidget):
         btn.clicked.connect(self.__deleteSelectedShots)
         beltLayout.addWidget(btn)
         mainLayout.addLayout(beltLayout)
-        self.__table = ShotView()
+        self.__batchDepth = 0  # see batchChanges()
+        self.__batchChanged = False
+        self.__table = ShotView(self.batchChanges)
         self.findSceneRequest = self.__table.findSceneRequest
         self.viewShotAction = self.__table.viewShotAction
         self.__table.pinShotAction.connect(self.onPinShot)
@@ -449,6 +641,16 @@ class ShotManager(QWidget):
         self.__table.setItemDelegateForColumn(3, delegate)
         mainLayout.addWidget(self.__table)
         self.__model = ShotItemModel()
+        self.__loadTimings = {}  # see loadTimings()
+        self.__savedScenes = {}  # shots per scene as last loaded or saved, see saveAllShots()
+        # interval index for shotAtTime(), rebuilt on first use after any change to the shots
+        self.__shotIndex = None
+        self.__model.itemChanged.connect(self.__invalidateShotIndex)
+        self.__model.rowsInserted.connect(self.__invalidateShotIndex)
+        self.__model.rowsRemoved.connect(self.__invalidateShotIndex)
+        self.__model.modelReset.connect(self.__invalidateShotIndex)
+        for signal in (self.__model.itemChanged, self.__model.rowsInserted, self.__model.rowsRemoved, self.__model.modelReset):
+            signal.connect(self.__onShotsChanged)
         shots = ShotModel()
         shots.setSourceModel(self.__model)
         self.__model.setColumnCount(7)
@@ -462,6 +664,13 @@ class ShotManager(QWidget):
         # Duration changes end, start changes end, end changes duration.
         self.shotChanged.connect(self.__onPropagateShotChange)
 
+        # rebuilds lookup tables of edited curves when idle
+        self.__bakeTimer = QTimer()
+        self.__bakeTimer.setInterval(100)
+        self.__bakeTimer.timeout.connect(self.__bakeTables)
+        self.setBakedPlayback(gSettings.value('bakedplayback', '0') == '1')
+        self.__binaryChannels = gSettings.value('binarychannels', '0') == '1'
+
     def shotView(self):
         return self.__table
 
@@ -478,25 +687,83 @@ class ShotManager(QWidget):
                 shot.end = shot.start + value
 
     def onPinShot(self, pinShot):
-        for shot in self.shots():
-            shot.pinned = shot == pinShot
+        with self.batchChanges():
+            for shot in self.shots():
+                shot.pinned = shot == pinShot
         self.shotPinned.emit(pinShot)
 
     @property
     def shotChanged(self):
         return self.__model.itemChanged
 
-    def shotAtTime(self, time):
-        candidate = None
+    def __onShotsChanged(self, *args):
+        if self.__batchDepth:
+            self.__batchChanged = True
+            return
+        self.shotsChanged.emit()
+
+    @contextmanager
+    def batchChanges(self):
+        """
+        Apply many row changes as one: until the outermost batch ends the shot view is not sorted or repainted
+        and shotsChanged is held back, then the view is sorted in a single layout change and shotsChanged is emitted once.
+        """
+        proxy = self.__table.model()
+        self.__batchDepth += 1
+        if self.__batchDepth == 1:
+            self.__batchChanged = False
+            dynamicSortFilter = proxy.dynamicSortFilter()
+            proxy.setDynamicSortFilter(False)
+            self.__table.setUpdatesEnabled(False)
+        try:
+            yield
+        finally:
+            self.__batchDepth -= 1
+            if not self.__batchDepth:
+                proxy.setDynamicSortFilter(dynamicSortFilter)
+                proxy.invalidate()
+                self.__table.setUpdatesEnabled(True)
+                if self.__batchChanged:
+                    self.shotsChanged.emit()
+
+    def __invalidateShotIndex(self, *args):
+        self.__shotIndex = None
+
+    def __buildShotIndex(self):
+        """
+        Split the timeline at every enabled shot's start and end, so within each piece the same shot is active.
+        Returns the first pinned shot, the piece boundaries and the active shot (or None) per piece.
+        """
+        shots = []
         for row in xrange(self.__model.rowCount()):
             shot = self.__model.item(row).data(Qt.UserRole + 1)
             if not shot.enabled:
                 continue
             if shot.pinned:
-                return shot
-            if shot.start <= time < shot.end:
-                candidate = shot
-        return candidate
+                return shot, [], []
+            shots.append((shot, shot.start, shot.end))
+
+        boundaries = sorted(set([shotStart for _, shotStart, _ in shots] + [shotEnd for _, _, shotEnd in shots]))
+        active = [None] * len(boundaries)
+        # later rows overwrite earlier ones, so when shots overlap the last one wins
+        for shot, start, end in shots:
+            for i in xrange(bisect_right(boundaries, start) - 1, bisect_right(boundaries, end) - 1):
+                active[i] = shot
+        return None, boundaries, active
+
+    def shotAtTime(self, time):
+        """
+        The pinned shot, or else the last enabled shot (in row order) with start <= time < end.
+        """
+        if self.__shotIndex is None:
+            self.__shotIndex = self.__buildShotIndex()
+        pinned, boundaries, active = self.__shotIndex
+        if pinned is not None:
+            return pinned
+        i = bisect_right(boundaries, time) - 1
+        if i < 0:
+            return None
+        return active[i]
 
     def additionalTextures(self, time):
         shot = self.shotAtTime(time)
@@ -508,7 +775,36 @@ class ShotManager(QWidget):
         shot = self.shotAtTime(time)
         if not shot:
             return {}
-        return shot.evaluate(time)
+        return shot.evaluate(time, self.__bakedPlayback)
+
+    def bakedPlayback(self):
+        return self.__bakedPlayback
+
+    def setBakedPlayback(self, state):
+        """
+        Evaluate curves from lookup tables, which are rebuilt in the background after edits.
+        Until then edited curves are evaluated exactly.
+        """
+        self.__bakedPlayback = state
+        gSettings.setValue('bakedplayback', '1' if state else '0')
+        if state:
+            self.__bakeTimer.start()
+        else:
+            self.__bakeTimer.stop()
+
+    def __bakeTables(self):
+        # bake a few curves at a time so the UI stays responsive
+        deadline = time.time() + 0.01
+        for shot in self.shots():
+            if not shot.isLoaded():
+                # not evaluated yet
+                continue
+            for curve in shot.curves.itervalues():
+                if curve.hasTable():
+                    continue
+                curve.bakeTable(ShotManager.BAKE_RATE, ShotManager.BAKE_TOLERANCE)
+                if time.time() > deadline:
+                    return
 
     def projectOpened(self):
         self.__loadAllShots()
@@ -521,13 +817,31 @@ class ShotManager(QWidget):
         self.__model.clear()
         # model.clear() removes the header labels
         self.__model.setHorizontalHeaderLabels(['Name', 'Scene', 'Start', 'End', 'Duration', 'Speed', 'Preroll'])
-        for sceneName in Scenes():
-            sceneName = os.path.splitext(sceneName)[0]
-            for shot in _deserializeSceneShots(sceneName):
-                self.__model.appendRow(shot.items)
+        sceneNames = [os.path.splitext(sceneName)[0] for sceneName in Scenes()]
+        sceneFiles = [os.path.join(ScenesPath(), sceneName + SCENE_EXT) for sceneName in sceneNames]
+        results = readSnapshot(ProjectFile(), sceneFiles)
+        if results is None:
+            results = scanScenes(sceneFiles)
+            writeSnapshot(ProjectFile(), sceneFiles, results)
+        self.__loadTimings = {}
+        self.__savedScenes = {}
+        with self.batchChanges():
+            for sceneName, (sceneShots, sources, seconds) in zip(sceneNames, results):
+                self.__loadTimings[sceneName] = seconds
+                self.__savedScenes[sceneName] = []
+                for shot in _deserializeSceneShots(sceneName, sceneShots):
+                    self.__model.appendRow(shot.items)
+                    self.__savedScenes[sceneName].append(shot)
 
         self.__table.sortByColumn(2, Qt.AscendingOrder)
 
+    def loadTimings(self):
+        """
+        Seconds it took to read each scene file at project open, by scene name.
+        When the project was opened from its snapshot these are the timings of the open that wrote the snapshot.
+        """
+        return self.__loadTimings
+
     def shots(self):
         for row in xrange(self.__model.rowCount()):
             shot = self.__model.item(row).data(Qt.UserRole + 1)
@@ -538,10 +852,45 @@ class ShotManager(QWidget):
         self.__table.clearSelection()
         self.__table.selectRow(idx.row())
 
-    def saveAllShots(self):
+    def binaryChannels(self):
+        return self.__binaryChannels
+
+    def setBinaryChannels(self, state):
+        """
+        Save channel key data to a binary file per scene instead of as text in the scene XML, applies from the next save.
+        Both are always read.
+        """
+        self.__binaryChannels = state
+        gSettings.setValue('binarychannels', '1' if state else '0')
+        # rewrite every scene in the new format
+        self.__savedScenes = {}
+
+    def modifiedScenes(self):
+        """
+        Names of the scenes whose shots changed since they were loaded or last saved:
+        a shot was added, removed or has Shot.isModified().
+        """
+        shots = list(self.shots())
+        result = []
         for sceneName in Scenes():
             sceneName = os.path.splitext(sceneName)[0]
-            _saveSceneShots(sceneName, self.shots())
+            sceneShots = [shot for shot in shots if shot.sceneName == sceneName]
+            if sceneShots != self.__savedScenes.get(sceneName) or any(shot.isModified() for shot in sceneShots):
+                result.append(sceneName)
+        return result
+
+    def saveAllShots(self):
+        """
+        Rewrite the scene files of modifiedScenes(), the user camera positions of all scenes are saved in one go.
+        """
+        _saveUserFile([os.path.splitext(sceneName)[0] for sceneName in Scenes()])
+        shots = list(self.shots())
+        for sceneName in self.modifiedScenes():
+            sceneShots = [shot for shot in shots if shot.sceneName == sceneName]
+            _saveSceneShots(sceneName, sceneShots, self.__binaryChannels)
+            for shot in sceneShots:
+                shot.markSaved()
+            self.__savedScenes[sceneName] = sceneShots
 
     def __onCurrentChanged(self, current, previous):
         row = self.__table.model().mapToSource(current).row()
@@ -640,15 +989,22 @@ class ShotManager(QWidget):
         self.__model.appendRow(shot.items)
 
     def __duplicateSelectedShots(self):
-        for shot in self.__selectedShots():
-            clone = shot.clone()
-            self.__model.appendRow(clone.items)
+        with self.batchChanges():
+            for shot in list(self.__selectedShots()):
+                clone = shot.clone()
+                self.__model.appendRow(clone.items)
 
     def __deleteShots(self, rows):
-        rows = list(set(rows))
-        rows.sort(key=lambda x: -x)
-        for row in rows:
-            self.__model.removeRow(row)
+        rows = sorted(set(rows))
+        with self.batchChanges():
+            # remove runs of adjacent rows at once, bottom up so the remaining row numbers stay valid
+            end = len(rows)
+            while end:
+                start = end - 1
+                while start and rows[start - 1] == rows[start] - 1:
+                    start -= 1
+                self.__model.removeRows(rows[start], end - start)
+                end = start
 
     def __deleteSelectedShots(self):
         rows = []
@@ -0,0 +1,166 @@
+"""
+Uniforms of the whole timeline baked at a fixed frame rate into a memory mapped file,
+so long captures read every frame's uniforms without evaluating any curves.
+Interactive playback does not use it: it samples arbitrary times, has to show edits immediately
+and has the curve lookup tables of ShotManager.setBakedPlayback() for speed.
+"""
+import mmap
+import struct
+from array import array
+
+_FLOAT = struct.Struct('f')
+_INT = struct.Struct('i')
+
+
+class TimelineCache(object):
+    """
+    The file has one float32 column per uniform component, followed by an int32 column with the index of
+    the shot that is active at each frame, -1 if there is none. Columns are shared by shots that have the same uniform.
+
+    update() only evaluates the frames whose shot changed, or whose shot's animation changed since the last update.
+    """
+
+    def __init__(self, path, times):
+        self.__path = path
+        self.__times = list(times)
+        self.__columns = []  # (uniform name, component index or None for a float uniform)
+        self.__shots = []  # shot per shot index
+        self.__layouts = {}  # per shot a list of (uniform name, column indices, is a float)
+        self.__revisions = {}  # revision per shot at the time its frames were baked
+        self.__frameShots = [None] * len(self.__times)
+        self.__file = None
+        self.__mmap = None
+        self.__resize([])
+
+    def path(self):
+        return self.__path
+
+    def times(self):
+        return self.__times
+
+    def __len__(self):
+        return len(self.__times)
+
+    def close(self):
+        if self.__mmap is not None:
+            self.__mmap.close()
+            self.__file.close()
+            self.__mmap = None
+            self.__file = None
+
+    def __readColumn(self, index):
+        size = len(self.__times) * 4
+        column = array('f' if index < len(self.__columns) else 'i')
+        column.fromstring(self.__mmap[index * size:(index + 1) * size])
+        return column
+
+    def __writeColumn(self, index, column):
+        size = len(self.__times) * 4
+        self.__mmap[index * size:(index + 1) * size] = column.tostring()
+
+    def __resize(self, columns):
+        """
+        Recreate the file with the given columns, keeping the data of columns that already existed.
+        """
+        numFrames = len(self.__times)
+        data = [array('f', [0.0]) * numFrames for _ in columns]
+        if self.__mmap is not None:
+            for i, column in enumerate(self.__columns):
+                data[columns.index(column)] = self.__readColumn(i)
+            data.append(self.__readColumn(len(self.__columns)))
+            self.close()
+        else:
+            data.append(array('i', [-1]) * numFrames)
+        self.__columns = columns
+
+        # mmap can not map empty files
+        size = max(numFrames * 4 * len(data), 1)
+        self.__file = open(self.__path, 'w+b')
+        self.__file.truncate(size)
+        self.__mmap = mmap.mmap(self.__file.fileno(), size)
+        for i, column in enumerate(data):
+            self.__writeColumn(i, column)
+
+    def update(self, shotManager):
+        """
+        Bake the frames of shots that changed, shots are found with shotManager.shotAtTime().
+        """
+        frameShots = [shotManager.shotAtTime(time) for time in self.__times]
+        revisions = {}
+        dirty = {}
+        for frame, shot in enumerate(frameShots):
+            if shot is None:
+                continue
+            if shot not in revisions:
+                revisions[shot] = shot.revision()
+            if shot is not self.__frameShots[frame] or revisions[shot] != self.__revisions.get(shot):
+                dirty.setdefault(shot, []).append(frame)
+        self.__frameShots = frameShots
+        self.__revisions = revisions
+
+        # evaluate dirty frames and find the columns they need
+        columns = list(self.__columns)
+        results = {}
+        for shot, frames in dirty.iteritems():
+            results[shot] = shot.evaluateMany([self.__times[frame] for frame in frames])
+            for name, value in (results[shot][0].iteritems() if results[shot] else ()):
+                if isinstance(value, float):
+                    keys = [(name, None)]
+                else:
+                    keys = [(name, i) for i in xrange(len(value))]
+                for key in keys:
+                    if key not in columns:
+                        columns.append(key)
+        if columns != self.__columns:
+            self.__resize(columns)
+
+        # shot index per frame
+        self.__shots = []
+        shotIndices = {}
+        shotColumn = array('i', [-1]) * len(self.__times)
+        for frame, shot in enumerate(frameShots):
+            if shot is None:
+                continue
+            if shot not in shotIndices:
+                shotIndices[shot] = len(self.__shots)
+                self.__shots.append(shot)
+            shotColumn[frame] = shotIndices[shot]
+        self.__writeColumn(len(self.__columns), shotColumn)
+
+        # write the dirty frames
+        self.__layouts = dict((shot, self.__layouts[shot]) for shot in self.__shots if shot not in dirty)
+        for shot, frames in dirty.iteritems():
+            layout = []
+            for name, value in results[shot][0].iteritems():
+                if isinstance(value, float):
+                    layout.append((name, [columns.index((name, None))], True))
+                else:
+                    layout.append((name, [columns.index((name, i)) for i in xrange(len(value))], False))
+            self.__layouts[shot] = layout
+            for name, indices, isFloat in layout:
+                for component, index in enumerate(indices):
+                    column = self.__readColumn(index)
+                    for frame, data in zip(frames, results[shot]):
+                        column[frame] = data[name] if isFloat else data[name][component]
+                    self.__writeColumn(index, column)
+        self.__mmap.flush()
+
+    def shot(self, frame):
+        index = _INT.unpack_from(self.__mmap, (len(self.__columns) * len(self.__times) + frame) * 4)[0]
+        if index < 0:
+            return None
+        return self.__shots[index]
+
+    def uniforms(self, frame):
+        """
+        Uniforms at the given frame as Shot.evaluate() returns them, at float32 precision.
+        """
+        index = _INT.unpack_from(self.__mmap, (len(self.__columns) * len(self.__times) + frame) * 4)[0]
+        if index < 0:
+            return {}
+        numFrames = len(self.__times)
+        data = {}
+        for name, indices, isFloat in self.__layouts[self.__shots[index]]:
+            values = [_FLOAT.unpack_from(self.__mmap, (column * numFrames + frame) * 4)[0] for column in indices]
+            data[name] = values[0] if isFloat else values
+        return data
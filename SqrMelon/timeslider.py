@@ -11,7 +11,7 @@ import OSC
 
 import fileutil
 import icons
-from util import gSettings, toPrettyXml, ProjectDir, ProjectFile
+from util import gSettings, writePrettyXml, ProjectDir, ProjectFile
 
 
 class OSCClient(object):
@@ -184,7 +184,7 @@ class Timer(object):
         root.attrib['TimerMaxTime'] = str(self.__maxTime)
         root.attrib['TimerBPS'] = str(self.__BPS)
         with fileutil.edit(project, 'w') as fh:
-            fh.write(toPrettyXml(root))
+            writePrettyXml(root, fh)
 
     def goToStart(self):
         self.time = self.__start
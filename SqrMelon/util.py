@@ -1,10 +1,10 @@
 import os
 from xml.etree import cElementTree
 import colorsys
-import xml.dom.minidom
+from cStringIO import StringIO
 import fileutil
 from qtutil import *
-import re
+from sceneparse import ReadXMLWithIncludes, writePrettyXml
 
 gSettings = QSettings('PB', 'Py64k')
 PROJ_EXT = '.p64'
@@ -13,20 +13,7 @@ SCENE_EXT = '.xml'
 
 
 def ParseXMLWithIncludes(xmlFilePath):
-    with fileutil.read(xmlFilePath) as fh:
-        text = fh.read()
-
-    subs = []
-    for result in re.finditer(r'<!--[ \t]*#[ \t]*include[ \t]+(.+)[ \t]*-->', text):
-        inline = result.group(1).strip()
-        with fileutil.read(os.path.join(os.path.dirname(xmlFilePath), inline)) as fh:
-            inlineText = fh.read()
-        subs.append((result.start(0), result.end(0), inlineText))
-
-    for start, end, repl in reversed(subs):
-        text = '{}{}{}'.format(text[:start], repl, text[end:])
-
-    xRoot = cElementTree.fromstring(text)
+    xRoot = cElementTree.fromstring(ReadXMLWithIncludes(xmlFilePath))
     return xRoot
 
 
@@ -85,11 +72,12 @@ def TemplateSourceFolderFromName(name, sub=''):
 
 
 def toPrettyXml(root):
-    root.text = None
-    text = cElementTree.tostring(root)
-    text = xml.dom.minidom.parseString(text).toprettyxml()
-    text = text.replace('\r', '\n')
-    return '\n'.join(line for line in text.split('\n') if line and line.strip())
+    """
+    Text of writePrettyXml(), prefer writing to the file directly.
+    """
+    fh = StringIO()
+    writePrettyXml(root, fh)
+    return fh.getvalue()
 
 
 _randomColorSeed = 0.0
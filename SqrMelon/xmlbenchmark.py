@@ -0,0 +1,56 @@
+# simple script to time saving a large generated scene with sceneparse.writePrettyXml against the minidom round trip it replaced
+# usage: python xmlbenchmark.py [shots] [channels per shot] [keys per channel]
+import random
+import sys
+import time
+import xml.dom.minidom
+from cStringIO import StringIO
+from xml.etree import cElementTree
+from sceneparse import writePrettyXml
+
+
+def minidomPrettyXml(root):
+    root.text = None
+    text = cElementTree.tostring(root)
+    text = xml.dom.minidom.parseString(text).toprettyxml()
+    text = text.replace('\r', '\n')
+    return '\n'.join(line for line in text.split('\n') if line and line.strip())
+
+
+def generateScene(numShots, numChannels, numKeys):
+    xScene = cElementTree.Element('Scene')
+    cElementTree.SubElement(xScene, 'Template', {'name': 'default'})
+    for i in xrange(numShots):
+        xShot = cElementTree.SubElement(xScene, 'Shot', {'name': 'Shot%s' % i, 'scene': 'Generated', 'start': str(i * 8.0), 'end': str(i * 8.0 + 8.0),
+                                                         'enabled': 'True', 'speed': '1.0', 'preroll': '0.0'})
+        for j in xrange(numChannels):
+            xChannel = cElementTree.SubElement(xShot, 'Channel', {'name': 'uChannel%s.%s' % (j / 4, 'xyzw'[j % 4]), 'mode': 'hermite'})
+            data = []
+            for k in xrange(numKeys):
+                data += [str(random.random()) for _ in xrange(2)] + [str(float(k)), str(random.uniform(-10.0, 10.0))] + [str(random.random()) for _ in xrange(2)] + ['0', '1']
+            xChannel.text = ','.join(data)
+        cElementTree.SubElement(xShot, 'Texture', {'name': 'uImage', 'path': 'images/a & b.png'})
+    return xScene
+
+
+def main(numShots=100, numChannels=16, numKeys=32):
+    random.seed(0)
+    xScene = generateScene(numShots, numChannels, numKeys)
+
+    start = time.time()
+    expected = minidomPrettyXml(xScene)
+    minidomTime = time.time() - start
+
+    start = time.time()
+    fh = StringIO()
+    writePrettyXml(xScene, fh)
+    streamTime = time.time() - start
+
+    assert fh.getvalue() == expected, 'Output differs from the minidom round trip.'
+    print '%s shots, %s channels, %s keys, %.1f MB' % (numShots, numChannels, numKeys, len(expected) / 1024.0 / 1024.0)
+    print 'minidom: %.1f ms' % (minidomTime * 1000.0)
+    print 'writePrettyXml: %.1f ms (%.1fx)' % (streamTime * 1000.0, minidomTime / streamTime)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])